@@ -0,0 +1,169 @@
+""" benchmark suite for the extractors and figure builders
+
+    every case runs on the seven static/first_team matches (times summed over them)
+    and on synthetic matches: the first match tiled `scale` times with shifted event
+    ids and jittered coordinates, so the event stream keeps the whoscored shape.
+    each case runs once under tracemalloc for its peak memory, then is timed as the
+    best of --repeat runs
+
+    python bench.py                              real matches plus 10x
+    python bench.py --scales 10 100 --out a.json save the results
+    python bench.py --baseline a.json            compare, exit 1 on a regression
+    python bench.py --only get_xT PassMap        run only some cases
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from plotly.subplots import make_subplots
+
+from helpers import (MatchEvents, prep_df, get_shots, get_prog_passes, get_goalkicks, get_xT,
+                     get_defensive_actions, get_ball_recoveries, get_aerials_data, get_corners)
+from passmap import PassMap
+from passnet import networks
+from pitch_plotly import plot_pitch
+from report import SECTIONS
+from event_store import MATCH_DIR
+
+SIDES = ["home", "away"]
+
+def synthetic_match(md, scale, seed=0):
+    """ a whoscored-shaped match `scale` times longer than md: the events are repeated
+        scale times, each copy with its own id/eventId range (OppositeRelatedEvent and
+        relatedEventId follow) and coordinates jittered by a couple of units
+    """
+    rng = np.random.default_rng(seed)
+    events = md["events"]
+    event_span = max(ev.get("eventId", 0) for ev in events) + 1
+    id_span = max(ev.get("id", 0) for ev in events) + 1
+    jitter = rng.normal(0, 2, size=(scale, len(events), 4))
+
+    out = []
+    for k in range(scale):
+        for i, ev in enumerate(events):
+            ev = dict(ev, id=ev.get("id", 0) + k*id_span, eventId=ev.get("eventId", 0) + k*event_span)
+            for j, col in enumerate(["x", "y", "endX", "endY"]):
+                if col in ev and k:
+                    ev[col] = float(np.clip(ev[col] + jitter[k, i, j], 0, 100))
+            if "relatedEventId" in ev:
+                ev["relatedEventId"] += k*event_span
+            if k and ev.get("qualifiers"):
+                ev["qualifiers"] = [dict(q, value=str(int(q["value"]) + k*event_span))
+                                    if q["type"]["displayName"] == "OppositeRelatedEvent" else q
+                                    for q in ev["qualifiers"]]
+            out.append(ev)
+    return dict(md, events=out)
+
+def per_side(extractor):
+    return lambda md, me: [extractor(me, side) for side in SIDES]
+
+def passmap_case(md, me):
+    fig = make_subplots(rows=1, cols=2)
+    for col, side in enumerate(SIDES, 1):
+        fig = PassMap(fig=fig, match_dict=me, nr=1, nc=col, side=side).plot_passmap()
+    return fig
+
+def pitch_case(md, me):
+    return plot_pitch(make_subplots(rows=1, cols=1), 1, 1)
+
+##case name -> fn(raw match dict, MatchEvents)
+CASES = {"prep_df": lambda md, me: prep_df(md),
+         "MatchEvents": lambda md, me: MatchEvents(md),
+         "get_shots": per_side(get_shots),
+         "get_prog_passes": per_side(get_prog_passes),
+         "get_goalkicks": per_side(get_goalkicks),
+         "get_xT": per_side(get_xT),
+         "get_defensive_actions": per_side(get_defensive_actions),
+         "get_ball_recoveries": per_side(get_ball_recoveries),
+         "get_corners": per_side(get_corners),
+         "get_aerials_data": lambda md, me: get_aerials_data(me),
+         "passnet.networks": per_side(networks),
+         "PassMap": passmap_case,
+         "plot_pitch": pitch_case}
+CASES.update({f"report.{name}": (lambda build: lambda md, me: build(me))(build) for name, build in SECTIONS.items()})
+
+def measure(fn, md, me, repeat=3):
+    """ (best seconds of `repeat` runs, peak traced MB of one run); the traced run
+        goes first and doubles as the warm-up of lazy imports and caches
+    """
+    tracemalloc.start()
+    fn(md, me)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(md, me)
+        best = min(best, time.perf_counter() - t)
+    return best, peak / 2**20
+
+def datasets(scales):
+    """ (label, [raw match dicts]) for the real matches and each synthetic scale"""
+    raw = []
+    for mf in sorted(glob.glob(os.path.join(MATCH_DIR, "*.json"))):
+        with open(mf) as f:
+            raw.append(json.load(f))
+    yield "real", raw
+    for scale in scales:
+        yield f"x{scale}", [synthetic_match(raw[0], scale)]
+
+def run(scales, repeat=3, only=None):
+    """ {case: {dataset: {"seconds", "peak_mb", "events"}}}"""
+    cases = {name: fn for name, fn in CASES.items() if not only or name in only}
+    results = {name: {} for name in cases}
+    for label, matches in datasets(scales):
+        parsed = [(md, MatchEvents(md)) for md in matches]
+        n_events = sum(len(md["events"]) for md in matches)
+        for name, fn in cases.items():
+            timings = [measure(fn, md, me, repeat=repeat) for md, me in parsed]
+            results[name][label] = {"seconds": sum(t for t, _ in timings), "peak_mb": max(p for _, p in timings),
+                                    "events": n_events}
+            print(f"{name:25} {label:5} {results[name][label]['seconds']*1000:10.1f} ms {results[name][label]['peak_mb']:8.1f} MB",
+                  flush=True)
+    return results
+
+def compare(results, baseline, threshold=0.25, min_seconds=0.005):
+    """ (case, dataset, base s, new s) of every case more than `threshold` slower than the
+        baseline, ignoring differences under min_seconds
+    """
+    regressions = []
+    for name, by_dataset in results.items():
+        for label, new in by_dataset.items():
+            base = baseline.get(name, {}).get(label)
+            if base is None:
+                continue
+            if new["seconds"] > base["seconds"] * (1 + threshold) and new["seconds"] - base["seconds"] > min_seconds:
+                regressions.append((name, label, base["seconds"], new["seconds"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="*", default=[10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--out", help="write the results to this json file")
+    parser.add_argument("--baseline", help="compare against results saved with --out")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results = run(args.scales, repeat=args.repeat, only=args.only)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                       "results": results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, threshold=args.threshold)
+        for name, label, base, new in regressions:
+            print(f"REGRESSION {name} {label}: {base*1000:.1f} ms -> {new*1000:.1f} ms ({new/base - 1:+.0%})")
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,108 @@
+""" auto-discovered catalogue of the first team matches
+
+    every static/first_team/<matchId>_<Home>_<Away>.json is a fixture; its GPS file
+    J<round>_<HOM>-<AWY>.xlsx is paired by matching the three letter codes against
+    the team names. a manifest (static/first_team/columnar/manifest.json) records each
+    file's size, mtime, content hash and derived artifacts, so sync() only re-ingests
+    new or changed files and startup cost does not grow with the season
+
+    python catalogue.py    sync and list the fixtures
+"""
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import warnings
+
+from event_store import MATCH_DIR, STORE_DIR, ingest, store_paths, feather
+from figure_cache import file_hash
+from instrument import timed
+
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+MATCH_NAME = re.compile(r"(\d+)_([^_]+)_(.+)$")
+
+def parse_match_file(match_file):
+    """ (match id, home team, away team) from <matchId>_<Home>_<Away>.json, None for
+        any other name
+    """
+    m = MATCH_NAME.match(os.path.splitext(os.path.basename(match_file))[0])
+    return m.groups() if m else None
+
+def is_code_for(code, team):
+    """ True if the letters of a fitness file team code appear in order in the team name,
+        e.g. GTF -> Getafe, ALV -> Deportivo Alaves"""
+    pattern = ".*".join(re.escape(c) for c in code.lower())
+    return any(re.match(pattern, word.lower()) for word in team.split())
+
+def find_fitness_file(home, away, fitness_files):
+    """ the J*_HOM-AWY.xlsx file of a fixture or None"""
+    for ff in fitness_files:
+        m = re.match(r"J\d+_(\w+)-(\w+)\.xlsx$", os.path.basename(ff))
+        if m and is_code_for(m.group(1), home) and is_code_for(m.group(2), away):
+            return ff
+    return None
+
+def read_manifest():
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def write_manifest(manifest):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = f"{MANIFEST_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"  ##one per writer: sessions sync concurrently
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, MANIFEST_FILE)
+
+@timed
+def sync(match_dir=MATCH_DIR, convert=True):
+    """ scan match_dir, re-ingest only new or changed matches and return the fixtures
+        sorted by label, each a dict with label, match_id, home, away, json and fitness
+    """
+    convert = convert and feather is not None
+    manifest = read_manifest()
+    match_files = sorted(glob.glob(os.path.join(match_dir, "*.json")))
+    fitness_files = sorted(glob.glob(os.path.join(match_dir, "J*.xlsx")))
+    fixtures, changed = [], False
+
+    for mf in match_files:
+        parsed = parse_match_file(mf)
+        if parsed is None: ##a stray json must not take the pages down
+            warnings.warn(f"skipping {mf}: not named <matchId>_<Home>_<Away>.json")
+            continue
+        st = os.stat(mf)
+        entry = manifest.get(mf)
+        if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            digest = file_hash(mf)
+            artifacts = list(store_paths(mf))
+            if convert and (entry is None or entry["hash"] != digest or not all(os.path.exists(p) for p in artifacts)):
+                ingest(mf)
+            elif convert:
+                for p in artifacts:  ##same content, only the mtime moved: keep the artifacts current
+                    os.utime(p)
+            match_id, home, away = parsed
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest,
+                     "match_id": match_id, "home": home, "away": away, "label": f"{home}-{away}",
+                     "fitness": find_fitness_file(home, away, fitness_files), "artifacts": artifacts}
+            manifest[mf] = entry
+            changed = True
+        elif entry["fitness"] is None or not os.path.exists(entry["fitness"]):
+            fitness = find_fitness_file(entry["home"], entry["away"], fitness_files)
+            if fitness != entry["fitness"]:
+                entry["fitness"], changed = fitness, True
+        fixtures.append(dict(entry, json=mf))
+
+    for mf in set(manifest) - {fx["json"] for fx in fixtures}:
+        del manifest[mf]
+        changed = True
+    if changed:
+        write_manifest(manifest)
+    return sorted(fixtures, key=lambda fx: fx["label"])
+
+if __name__ == "__main__":
+    for fx in sync(sys.argv[1] if len(sys.argv) > 1 else MATCH_DIR):
+        print(f"{fx['label']:30} {fx['json']:55} {fx['fitness']}")
@@ -0,0 +1,127 @@
+""" per-player drill-down of a match: shots, progressive passes, goal kicks and corners
+
+    EventIndex runs each helper once per side and keeps its rows together with a
+    player -> row positions index, so filtering to the players clicked or box/lasso selected
+    in the pass map or the recoveries chart is an iloc on precomputed positions, not a helper
+    rerun. the 2x2 pitch layout is built once per process and a click only adds plain trace
+    dicts to it
+
+    python drilldown.py    index build and per-click timings for every player of a match
+"""
+from functools import lru_cache
+
+import numpy as np
+from plotly.subplots import make_subplots
+
+from helpers import match_events, get_shots, get_prog_passes, get_goalkicks, get_corners
+from pitch_plotly import plot_pitches, segments, subplot_refs
+from instrument import timed
+
+##kind -> (title, extractor); every extractor returns player_name, x, y (and endX, endY for passes)
+KINDS = {"shots": ("Shots", get_shots),
+         "prog_passes": ("Progressive Passes", get_prog_passes),
+         "goalkicks": ("Goalkicks", get_goalkicks),
+         "corners": ("Corners", get_corners)}
+CELLS = [(1, 1), (1, 2), (2, 1), (2, 2)]
+SIDE_COLORS = {"home": "dodgerblue", "away": "red"}
+
+class EventIndex():
+    """ the drill-down rows of one match and their per-player positions"""
+
+    @timed
+    def __init__(self, md):
+        me = match_events(md)
+        self.teams = {side: me[side]["name"] for side in ["home", "away"]}
+        self.frames, self.rows = {}, {}
+        self.sides = {}  ##player -> side
+        for kind, (_, extract) in KINDS.items():
+            for side in ["home", "away"]:
+                df = extract(me, side).reset_index(drop=True)
+                self.frames[kind, side] = df
+                self.rows[kind, side] = {player: np.asarray(rows) for player, rows in df.groupby("player_name").indices.items()}
+        for side in ["home", "away"]:
+            self.sides.update({player: side for player in me.df.loc[me.masks[side], "player_name"].dropna().unique()})
+
+    def player_rows(self, kind, side, players):
+        """ rows of one kind of the given players of one side, in event order (empty frame if none)"""
+        rows = self.rows[kind, side]
+        positions = [rows[p] for p in players if p in rows and self.sides.get(p) == side]
+        return self.frames[kind, side].iloc[np.sort(np.concatenate(positions)) if positions else []]
+
+def point_player(data, point, players):
+    """ the player behind one clicked or selected point: the text/hovertext of a marker
+        (pass map nodes, shots, ...) or the category of a horizontal bar (recoveries)
+    """
+    trace = data[point["curveNumber"]]
+    for attr in ["text", "hovertext"]:
+        labels = trace.get(attr)
+        if labels is not None and not isinstance(labels, str) and point["pointNumber"] < len(labels):
+            if labels[point["pointNumber"]] in players:
+                return labels[point["pointNumber"]]
+    for axis in ["y", "x"]:
+        if point.get(axis) in players:
+            return point[axis]
+    return None
+
+def clicked_players(fig, points, players):
+    """ the players behind the clicked or box/lasso selected points, in point order, without repeats"""
+    data = fig["data"] if isinstance(fig, dict) else fig.to_plotly_json()["data"]
+    found = [point_player(data, point, players) for point in points or []]
+    return list(dict.fromkeys(p for p in found if p is not None))
+
+@lru_cache(maxsize=None)
+def _template():
+    """ (layout dict, [(xref, yref)] per cell) of the 2x2 pitch grid"""
+    fig = make_subplots(rows=2, cols=2, subplot_titles=[title for title, _ in KINDS.values()])
+    fig = plot_pitches(fig, CELLS, color="black")
+    fig.update_layout(width=800, height=900, autosize=True, showlegend=False)
+    fig.update_yaxes(scaleratio=0.8, showgrid=False, zeroline=False, showticklabels=False, range=[-2, 102])
+    fig.update_xaxes(showgrid=False, zeroline=False, showticklabels=False, range=[-2, 102])
+    return fig.to_plotly_json()["layout"], [subplot_refs(fig, nr, nc) for nr, nc in CELLS]
+
+@timed
+def player_fig(index, players):
+    """ figure dict of 2x2 pitches with the shots, progressive passes, goal kicks and corners
+        of one or more players, one trace per side and pitch
+    """
+    players = [players] if isinstance(players, str) else list(players)
+    layout, refs = _template()
+    data = []
+    for kind, (xref, yref) in zip(KINDS, refs):
+        for side, color in SIDE_COLORS.items():
+            df = index.player_rows(kind, side, players)
+            if not len(df):
+                continue
+            if "endX" in df:
+                xs, ys = segments(df["x"].values, df["y"].values, df["endX"].values, df["endY"].values)
+                data.append({"type": "scatter", "x": xs.tolist(), "y": ys.tolist(), "mode": "lines", "xaxis": xref,
+                             "yaxis": yref, "line": {"color": color, "width": 2}, "hoverinfo": "none"})
+            data.append({"type": "scatter", "x": df["x"].tolist(), "y": df["y"].tolist(), "mode": "markers",
+                         "xaxis": xref, "yaxis": yref, "marker": {"color": color, "size": 8},
+                         "text": df["player_name"].tolist(), "hovertemplate": "<b>%{text}</b><extra></extra>"})
+    return {"data": data, "layout": dict(layout, title={"text": ", ".join(players)})}
+
+if __name__ == "__main__":
+    import time
+
+    from event_store import load_match
+
+    me = load_match("static/first_team/1492277_Villarreal_Cadiz.json")
+    t = time.perf_counter()
+    index = EventIndex(me)
+    print(f"index: {(time.perf_counter() - t)*1000:.1f} ms")
+    import plotly.graph_objs as go
+    player_fig(index, "")  ##builds the shared layout once
+    fig = {"data": [{"type": "bar", "orientation": "h", "y": sorted(index.sides)}]}
+    timings = []
+    for i, player in enumerate(sorted(index.sides)):
+        t = time.perf_counter()
+        clicked = clicked_players(fig, [{"curveNumber": 0, "pointNumber": i, "y": player}], index.sides)
+        go.Figure(player_fig(index, clicked)).to_json()  ##as st.plotly_chart validates and serializes it
+        timings.append(time.perf_counter() - t)
+    print(f"{len(timings)} clicks (incl. validation and json): median {np.median(timings)*1000:.1f} ms, "
+          f"max {max(timings)*1000:.1f} ms")
+    t = time.perf_counter()
+    selected = clicked_players(fig, [{"curveNumber": 0, "pointNumber": i, "y": p} for i, p in enumerate(fig["data"][0]["y"])], index.sides)
+    go.Figure(player_fig(index, selected)).to_json()
+    print(f"selection of all {len(selected)} players: {(time.perf_counter() - t)*1000:.1f} ms")
@@ -0,0 +1,76 @@
+""" paired duel engine driven by the OppositeRelatedEvent qualifier
+
+    whoscored links the two sides of a duel through OppositeRelatedEvent: its value
+    is the eventId of the opponent's event, and eventIds are numbered per team. every
+    event is looked up once in an index over (teamId, eventId), so each duel joins to
+    its opponent with array operations, and won/lost counts per player pair come
+    out of one crosstab for a match or a whole season
+
+    python duels.py    season aerial and take-on leaders over static/first_team
+"""
+import numpy as np
+import pandas as pd
+
+##duel name -> (event types of the player, event types of the opponent they link to)
+DUELS = {"aerial": (["Aerial"], ["Aerial"]),
+         "take_on": (["TakeOn"], ["Challenge", "Tackle"])}
+
+PAIR_COLUMNS = ["playerId", "player_name", "teamId", "period_value", "minute", "second", "x", "y"]
+
+def event_keys(team_ids, event_ids):
+    return np.asarray(team_ids, dtype=np.int64) * 10**7 + np.asarray(event_ids, dtype=np.int64)
+
+def duel_pairs(me, duel="aerial", side=None):
+    """ one row per duel from the point of view of `duel`'s event types (of one side, or
+        both): the player, their opponent and whether the player's event was successful
+    """
+    types, opponent_types = DUELS[duel]
+    df = me.df
+    related = me.q.value("OppositeRelatedEvent")
+    rows = related.index.values
+    keep = df["type_displayName"].isin(types).values[rows]
+    if side is not None:
+        keep &= me.masks[side][rows]
+    rows = rows[keep]
+    related_ids = pd.to_numeric(related.values[keep], errors="coerce")
+
+    team = df["teamId"].values
+    home_id, away_id = me.team_ids["home"], me.team_ids["away"]
+    other_team = np.where(team[rows] == home_id, away_id, home_id)
+    lookup = pd.Index(event_keys(team, df["eventId"].values))
+    opponent = lookup.get_indexer(event_keys(other_team, np.nan_to_num(related_ids, nan=-1)))
+
+    found = opponent >= 0
+    found[found] = df["type_displayName"].isin(opponent_types).values[opponent[found]]
+    rows, opponent = rows[found], opponent[found]
+
+    pairs = df.iloc[rows][PAIR_COLUMNS].reset_index(drop=True)
+    pairs["opponent_id"] = df["playerId"].values[opponent]
+    pairs["opponent_name"] = df["player_name"].values[opponent]
+    pairs["opponent_team_id"] = df["teamId"].values[opponent]
+    pairs["won"] = df["outcomeType_value"].values[rows] == 1
+    return pairs.assign(duel=duel)
+
+def duel_counts(pairs, index="player_name", columns="opponent_name"):
+    """ (duels, won) player x opponent matrices of ints"""
+    total = pd.crosstab(pairs[index], pairs[columns])
+    won = pd.crosstab(pairs[index], pairs[columns], values=pairs["won"].astype(int), aggfunc="sum")
+    return total, won.reindex_like(total).fillna(0).astype(int)
+
+def duel_matrix(pairs, index="player_name", columns="opponent_name"):
+    """ player x opponent matrix of "duels/won" strings, "0" where they never met (strings
+        throughout, so the columns convert to arrow for st.dataframe)
+    """
+    total, won = duel_counts(pairs, index=index, columns=columns)
+    return (total.astype(str) + "/" + won.astype(str)).where(total != 0, "0")
+
+if __name__ == "__main__":
+    import glob
+    from event_store import load_match
+
+    pairs = pd.concat([duel_pairs(load_match(mf), duel).assign(match=mf)
+                       for mf in sorted(glob.glob("static/first_team/*.json")) for duel in DUELS], ignore_index=True)
+    for duel, group in pairs.groupby("duel"):
+        leaders = (group.groupby("player_name").agg(duels=("won", "size"), won=("won", "sum"))
+                        .sort_values(by="duels", ascending=False).head(10))
+        print(f"{duel}: {len(group)} duels\n{leaders.to_string()}\n")
@@ -0,0 +1,170 @@
+""" columnar on-disk store for the whoscored match files
+
+    python event_store.py                 convert every static/first_team/*.json
+    python event_store.py a.json b.json   convert only these files
+    python event_store.py --bench         load-time / RSS of json vs converted files
+
+    each match becomes static/first_team/columnar/<match>.feather (the typed event
+    columns the dashboard uses), <match>.qualifiers.feather (the long qualifier table
+    behind QualifierIndex) plus <match>.meta.json (teams, players without their
+    per-minute stats, playerIdNameDictionary and a few match fields)
+"""
+import json
+import os
+import sys
+import glob
+import threading
+import time
+
+import numpy as np
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+from instrument import timed
+
+MATCH_DIR = "static/first_team"
+STORE_DIR = os.path.join(MATCH_DIR, "columnar")
+STORE_VERSION = 2
+
+EVENT_COLUMNS = {"id": "float64", "eventId": "int32", "minute": "int16", "second": "float32",
+                 "expandedMinute": "int16", "period_value": "int8", "teamId": "int32",
+                 "playerId": "float64", "x": "float64", "y": "float64", "endX": "float64", "endY": "float64",
+                 "type_value": "int16", "type_displayName": "category",
+                 "outcomeType_value": "int8", "outcomeType_displayName": "category",
+                 "relatedEventId": "float64", "relatedPlayerId": "float64",
+                 "isTouch": "bool"}
+
+MATCH_FIELDS = ["playerIdNameDictionary", "periodMinuteLimits", "periodEndMinutes", "startTime", "venueName",
+                "score", "htScore", "ftScore", "maxMinute", "expandedMaxMinute"]
+TEAM_FIELDS = ["teamId", "name", "managerName", "field", "scores", "averageAge", "formations"]
+
+def store_paths(match_file):
+    """ (events file, qualifiers file, sidecar file) for a match json"""
+    name = os.path.join(STORE_DIR, os.path.splitext(os.path.basename(match_file))[0])
+    return name + ".feather", name + ".qualifiers.feather", name + ".meta.json"
+
+def to_frame(md):
+    """ the typed event table stored for a match"""
+    from helpers import prep_df ##only converting needs the helpers, reading the sidecar does not
+    df = prep_df(md)
+    for col, dtype in EVENT_COLUMNS.items():
+        if col not in df:
+            df[col] = np.nan
+        if dtype in ["int8", "int16", "int32"]:
+            df[col] = df[col].fillna(0)
+        df[col] = df[col].astype(dtype)
+    return df[list(EVENT_COLUMNS)]
+
+def to_meta(md):
+    """ the small sidecar: everything the helpers need apart from the events"""
+    meta = {k: md[k] for k in MATCH_FIELDS if k in md}
+    for side in ["home", "away"]:
+        meta[side] = {k: md[side][k] for k in TEAM_FIELDS if k in md[side]}
+        meta[side]["players"] = [{k: v for k, v in pl.items() if k != "stats"} for pl in md[side]["players"]]
+    meta["storeVersion"] = STORE_VERSION
+    return meta
+
+def ingest(match_file):
+    """ convert one whoscored json into its columnar file and sidecar; every file is
+        written under a temporary name and moved into place, the events file last (its
+        mtime marks the match as converted), so concurrent sessions never read a partial one
+    """
+    if feather is None:
+        raise ImportError("pyarrow is needed to write the columnar event store")
+    from qualifiers import QualifierIndex
+    with open(match_file) as f:
+        md = json.load(f)
+    events_file, qualifiers_file, meta_file = store_paths(match_file)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = lambda path: f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    qt = QualifierIndex.from_events(md["events"]).table.astype({"type_displayName": "category"})
+    feather.write_feather(qt, tmp(qualifiers_file), compression="uncompressed")
+    with open(tmp(meta_file), "w") as f:
+        json.dump(to_meta(md), f)
+    feather.write_feather(to_frame(md), tmp(events_file), compression="uncompressed")
+    for path in [qualifiers_file, meta_file, events_file]:
+        os.replace(tmp(path), path)
+    return events_file
+
+def is_converted(match_file):
+    """ True if an up to date converted file exists for the match"""
+    paths = store_paths(match_file)
+    if feather is None or not all(os.path.exists(p) for p in paths):
+        return False
+    events_file = paths[0]
+    return os.path.getmtime(events_file) >= os.path.getmtime(match_file)
+
+@timed
+def load_match(match_file, use_store=True):
+    """ MatchEvents for a match, read (memory-mapped) from the columnar store
+        and falling back to the raw json when there is no converted file
+    """
+    from helpers import MatchEvents
+    from qualifiers import QualifierIndex
+    if use_store and is_converted(match_file):
+        events_file, qualifiers_file, meta_file = store_paths(match_file)
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta.get("storeVersion") == STORE_VERSION:
+            df = feather.read_table(events_file, memory_map=True).to_pandas()
+            d = {float(k):v for k,v in meta["playerIdNameDictionary"].items()}
+            df["player_name"] = df["playerId"].map(d)
+            qt = feather.read_table(qualifiers_file, memory_map=True).to_pandas()
+            return MatchEvents(meta, df=df, qualifiers=QualifierIndex(qt, len(df)))
+
+    with open(match_file) as f:
+        return MatchEvents(json.load(f))
+
+@timed
+def load_meta(match_file):
+    """ match metadata (teams, players, playerIdNameDictionary) without parsing the events"""
+    if is_converted(match_file):
+        with open(store_paths(match_file)[2]) as f:
+            meta = json.load(f)
+        if meta.get("storeVersion") == STORE_VERSION:
+            return meta
+    with open(match_file) as f:
+        return to_meta(json.load(f))
+
+def _max_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _measure(mode, match_file):
+    """ run in a fresh interpreter: time and peak RSS growth of one load"""
+    from helpers import prep_df
+    prep_df({"events": [{"playerId": 1.0, "qualifiers": []}], "playerIdNameDictionary": {}}) ##warm up lazy imports
+    if feather is not None:
+        import pyarrow as pa
+        pa.table({"x": [0.0]}).to_pandas()
+    rss = _max_rss_mb()
+    t = time.perf_counter()
+    load_match(match_file, use_store=(mode == "store"))
+    elapsed = time.perf_counter() - t
+    print(json.dumps({"ms": elapsed*1000, "rss_mb": _max_rss_mb() - rss}))
+
+def bench(match_files):
+    """ print load time and RSS growth of the json and columnar paths per match"""
+    import subprocess
+    print(f"{'match':40} {'json ms':>8} {'json MB':>8} {'store ms':>9} {'store MB':>9}")
+    for mf in match_files:
+        row = {}
+        for mode in ["json", "store"]:
+            out = subprocess.run([sys.executable, __file__, "--measure", mode, mf],
+                                 capture_output=True, text=True, check=True).stdout
+            row[mode] = json.loads(out.strip().splitlines()[-1])
+        print(f"{os.path.basename(mf)[:40]:40} {row['json']['ms']:8.1f} {row['json']['rss_mb']:8.1f} "
+              f"{row['store']['ms']:9.1f} {row['store']['rss_mb']:9.1f}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--measure"]:
+        _measure(args[1], args[2])
+    elif args[:1] == ["--bench"]:
+        bench(args[1:] or sorted(glob.glob(os.path.join(MATCH_DIR, "*.json"))))
+    else:
+        for mf in args or sorted(glob.glob(os.path.join(MATCH_DIR, "*.json"))):
+            print(ingest(mf))
@@ -0,0 +1,181 @@
+""" headless export of the Senior Team match reports
+
+    every match in static/first_team is rendered, without streamlit, to one self-contained
+    HTML file (plotly.js and the story image inlined) with the sections of the
+    app in the same order; --images also writes each figure as a static image (needs the
+    kaleido package). matches are exported in parallel, one process each, and a manifest
+    in the output directory records the inputs of every export, so a match is only
+    exported again when its events, story image or the report code change
+
+    python export.py                        export new or changed matches to exports/
+    python export.py --images png pdf       ... plus static images of every figure
+    python export.py --jobs 2 --force       two processes, re-export everything
+    python export.py --only Villarreal-Cadiz
+"""
+import argparse
+import base64
+import hashlib
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import catalogue
+import figure_cache
+import images
+from event_store import load_meta
+
+OUT_DIR = "exports"
+MANIFEST = "manifest.json"
+
+##(kind, key, label) in page order, as app.py lays out the Senior Team page
+LAYOUT = [("image", "story", "Match Story"),
+          ("heading", None, "Out of Possession"),
+          ("section", "heatmaps", "Heatmaps"),
+          ("section", "recoveries", "Ball Recoveries"),
+          ("section", "aerials", "Aerial Duels Matrix"),
+          ("heading", None, "In Possession"),
+          ("section", "shots", "Shots"),
+          ("section", "prog_passes", "Progressive Passes"),
+          ("section", "goalkicks", "Goalkicks"),
+          ("section", "passmaps", "Passmap & Average Position"),
+          ("heading", None, "Set-Pieces"),
+          ("section", "set_pieces", "Corners")]
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script type="text/javascript">{plotlyjs}</script>
+<style>body {{font-family: sans-serif; max-width: 1400px; margin: auto}} h1, h2 {{text-align: center}}
+img {{width: 100%}} table {{margin: auto; border-collapse: collapse}} td, th {{padding: 2px 6px; text-align: center}}</style>
+</head>
+<body>
+<h2>{title}</h2>
+{body}
+</body>
+</html>
+"""
+
+def export_key(match_file, formats):
+    """ hash of everything an export depends on: the match, its story image, the code, the formats"""
+    version = figure_cache.code_version(("export", "images"))
+    h = hashlib.sha1(f"{figure_cache.file_hash(match_file)}|{version}|{sorted(formats)}".encode())
+    src = images.story_image(match_file)
+    h.update((figure_cache.file_hash(src) if os.path.exists(src) else "-").encode())
+    return h.hexdigest()
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def image_tag(src):
+    """ <img> with the web variant of a story PNG inlined, "" if the match has none"""
+    if not os.path.exists(src):
+        return ""
+    data = base64.b64encode(images.image_bytes(src, width=images.COLUMN_WIDTHS["main"])).decode()
+    return f'<img src="data:image/webp;base64,{data}">'
+
+def section_html(obj):
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_html(border=1)
+    import plotly.io as pio
+    return pio.to_html(obj, include_plotlyjs=False, full_html=False, config={"displayModeBar": False})
+
+def export_match(match_file, label, out_dir=OUT_DIR, formats=()):
+    """ write <out_dir>/<label>.html (and <out_dir>/<label>/<section>.<fmt> for each
+        format) and return the written paths; runs in a worker process
+    """
+    from plotly.offline import get_plotlyjs
+    from report import section ##imported in the workers, the parent only schedules
+
+    meta = load_meta(match_file)
+    title = f"{meta['home']['name']} vs {meta['away']['name']}"
+    sources = {"story": images.story_image(match_file)}
+
+    body, written = [], []
+    for kind, key, text in LAYOUT:
+        if kind == "heading":
+            body.append(f"<h1>{html.escape(text)}</h1>")
+            continue
+        body.append(f"<h2>{html.escape(text)}</h2>")
+        if kind == "image":
+            body.append(image_tag(sources[key]))
+            continue
+        obj = section(match_file, key)
+        body.append(section_html(obj))
+        if formats and not isinstance(obj, pd.DataFrame):
+            import plotly.io as pio
+            os.makedirs(os.path.join(out_dir, label), exist_ok=True)
+            for fmt in formats:
+                path = os.path.join(out_dir, label, f"{key}.{fmt}")
+                pio.write_image(obj, path, format=fmt, width=1400)
+                written.append(path)
+
+    path = os.path.join(out_dir, f"{label}.html")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(PAGE.format(title=html.escape(title), plotlyjs=get_plotlyjs(), body="\n".join(body)))
+    os.replace(path + ".tmp", path)
+    return [path] + written
+
+def export_all(out_dir=OUT_DIR, formats=(), jobs=None, force=False, only=None, executor=ProcessPoolExecutor):
+    """ export every new or changed match in parallel; returns (exported, skipped) labels.
+        processes by default (the CLI); callers inside the streamlit server pass
+        executor=ThreadPoolExecutor, as a server must not fork
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    fixtures = [fx for fx in catalogue.sync() if not only or fx["label"] in only]
+    manifest = read_manifest(out_dir)
+    pending, skipped = {}, []
+    for fx in fixtures:
+        key = export_key(fx["json"], formats)
+        entry = manifest.get(fx["label"])
+        if not force and entry and entry["key"] == key and all(os.path.exists(p) for p in entry["files"]):
+            skipped.append(fx["label"])
+        else:
+            pending[fx["label"]] = (fx["json"], key)
+
+    exported = []
+    if pending:
+        with executor(max_workers=min(jobs or os.cpu_count(), len(pending))) as pool:
+            futures = {pool.submit(export_match, mf, label, out_dir, formats): label for label, (mf, _) in pending.items()}
+            for future in as_completed(futures):
+                label = futures[future]
+                manifest[label] = {"json": pending[label][0], "key": pending[label][1], "files": future.result()}
+                write_manifest(out_dir, manifest) ##after each match, so an interrupted run keeps its progress
+                exported.append(label)
+                print(f"exported {label}", flush=True)
+    return exported, skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--images", nargs="*", default=[], metavar="FORMAT", help="e.g. png svg pdf (needs kaleido)")
+    parser.add_argument("--jobs", type=int, help="worker processes, default one per core")
+    parser.add_argument("--force", action="store_true", help="re-export unchanged matches too")
+    parser.add_argument("--only", nargs="*", help="match labels, e.g. Villarreal-Cadiz")
+    args = parser.parse_args()
+
+    if args.images:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            sys.exit("--images needs the kaleido package: pip install kaleido")
+
+    t = time.perf_counter()
+    exported, skipped = export_all(args.out, formats=args.images, jobs=args.jobs, force=args.force, only=args.only)
+    print(f"{len(exported)} exported, {len(skipped)} unchanged, in {time.perf_counter() - t:.1f} s -> {args.out}/")
@@ -0,0 +1,154 @@
+""" persistent on-disk cache of built report sections
+
+    entries are keyed by (match file content hash, section, code version) and hold
+    the serialized plotly json of a figure (or a table as split-oriented json), so
+    a warm match switch is a file read. the code version hashes the modules the sections
+    are built from (BUILD_MODULES), so editing helpers/passmap/... or the match file
+    simply misses the cache, while editing a benchmark or script does not; stale entries
+    are dropped by the size-bounded LRU eviction
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import pandas as pd
+
+import instrument
+
+CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR", ".figure_cache")
+MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+##modules the report sections are built from; the season, fitness and export keys add their own
+BUILD_MODULES = ("report", "helpers", "qualifiers", "xt", "duels", "passnet", "passmap", "pitch_plotly",
+                 "heatmaps", "drilldown", "event_store", "workbooks", "figure_cache")
+
+_prebuild_started = False
+_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _hash_file(path, mtime_ns, size):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_hash(path):
+    """ content hash of a file, recomputed only when its mtime or size changes"""
+    st = os.stat(path)
+    return _hash_file(path, st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=None)
+def code_version(extra=()):
+    """ hash of the python modules that build the sections, plus the `extra` module names"""
+    h = hashlib.sha1()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(set(BUILD_MODULES) | set(extra)):
+        with open(os.path.join(root, f"{name}.py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+def entry_path(match_file, section):
+    key = hashlib.sha1(f"{file_hash(match_file)}|{section}|{code_version()}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{section}-{key}.json")
+
+def serialize(obj):
+    """ plotly figures as their own json, dataframes as split-oriented json"""
+    if isinstance(obj, pd.DataFrame):
+        return json.dumps({"kind": "table", "data": json.loads(obj.to_json(orient="split")),
+                           "names": [obj.index.name, obj.columns.name]})
+    return json.dumps({"kind": "figure", "data": json.loads(obj.to_json())})
+
+def deserialize(text):
+    """ a plotly figure dict (accepted by st.plotly_chart as is) or a dataframe"""
+    entry = json.loads(text)
+    if entry["kind"] == "table":
+        data = entry["data"]
+        df = pd.DataFrame(data["data"], index=data["index"], columns=data["columns"])
+        df.index.name, df.columns.name = entry["names"]
+        return df
+    return entry["data"]
+
+def get(match_file, section):
+    """ cached section or None; a hit refreshes the entry's LRU position"""
+    path = entry_path(match_file, section)
+    try:
+        with open(path) as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass ##evicted since the read (prebuild thread or another session); the text is still good
+    return deserialize(text)
+
+def put(match_file, section, obj):
+    """ store a built section, then evict down to MAX_BYTES; returns the stored text"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = entry_path(match_file, section)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    text = serialize(obj)
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    evict()
+    return text
+
+def evict(max_bytes=None):
+    """ delete least recently used entries until the cache fits in max_bytes"""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        entries = []
+        for path in glob.glob(os.path.join(CACHE_DIR, "*.json")):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def get_or_build(match_file, section, build):
+    """ cached section, or build() it, cache it and return the stored form
+
+        the stored form is returned on a miss too, so a figure looks the same
+        whether it came from the cache or was just built
+    """
+    with instrument.span(f"figure_cache.{section}") as fields:
+        obj = get(match_file, section)
+        fields["cache"] = "miss" if obj is None else "hit"
+        if obj is None:
+            obj = deserialize(put(match_file, section, build()))
+    return obj
+
+def prebuild(match_files, sections, load):
+    """ build every missing (match, section) entry; load(match_file) gives what
+        the section builders take, called only for matches with something missing
+    """
+    for mf in match_files:
+        missing = {name: build for name, build in sections.items() if not os.path.exists(entry_path(mf, name))}
+        if not missing:
+            continue
+        md = load(mf)
+        for name, build in missing.items():
+            put(mf, name, build(md))
+
+def start_prebuild(match_files, sections, load):
+    """ warm the cache in a background thread, once per process"""
+    global _prebuild_started
+    with _lock:
+        if _prebuild_started:
+            return
+        _prebuild_started = True
+    threading.Thread(target=prebuild, args=(list(match_files), sections, load), daemon=True).start()
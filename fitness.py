@@ -0,0 +1,202 @@
+""" consolidated GPS (fitness) table of the first team matches
+
+    every static/first_team/J*.xlsx paired with a match by the catalogue is parsed once
+    (in parallel when several workbooks are new, through the workbooks pickle cache), its
+    player rows are linked to the whoscored playerId by shirt number (falling back to the
+    name) within the team the report covers (usually ours, but J29 is Granada's) and all
+    matches are kept as one typed table in static/first_team/columnar/fitness.feather.
+    the table is rebuilt only when a GPS file, a match or this code changes, so physical
+    load against on-ball actions is an in-memory merge on (match, player_name)
+
+    python fitness.py    build the table and print sprints against progressive passes
+"""
+import hashlib
+import json
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import catalogue
+import workbooks
+from event_store import STORE_DIR, feather, load_meta
+from figure_cache import file_hash, code_version
+from instrument import timed
+from shared_cache import memoize
+
+FITNESS_FILE = os.path.join(STORE_DIR, "fitness.feather")
+##pool that parses new workbooks: threads in the app (a streamlit server must not fork), processes from the CLI
+EXECUTOR = ThreadPoolExecutor
+TEAM = "Villarreal"
+
+##GPS report columns (spanish) -> short names; the other metrics keep their report names
+COLUMNS = {"Dorsal": "shirt", "Nombre": "first_name", "Apellido": "last_name", "Minutos": "minutes",
+           "Distancia Total Recorrida": "distance",
+           "Distancia Total Recorrida / min": "distance_per_min",
+           "Distancia Total Recorrida 14 - 21 km / h": "distance_14_21",
+           "Distancia Total Recorrida >21 km / h": "distance_21",
+           "Distancia Total Recorrida >24 km / h": "distance_24",
+           "Nº Total Sprints >21 km / h": "sprints",
+           "Nº Total Sprints >24 km / h": "sprints_24",
+           "Velocidad Máxima Total": "max_speed"}
+
+def parse_report(raw):
+    """ the player rows of a GPS report sheet, numeric columns as float32"""
+    header = np.flatnonzero((raw == "Dorsal").any(axis=1).values)[0]
+    columns = raw.iloc[header].values
+    keep = ~pd.isnull(columns)
+    df = pd.DataFrame(raw.iloc[header + 1:, keep].values, columns=columns[keep])
+    df = df[pd.to_numeric(df["Dorsal"], errors="coerce").notna()].rename(columns=COLUMNS).reset_index(drop=True)
+    numeric = [c for c in df.columns if c not in ("first_name", "last_name")]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce").astype("float32")
+    df["shirt"] = df["shirt"].astype("int16")
+    return df
+
+def normalize(name):
+    """ lower case name tokens without accents"""
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    return set(name.lower().replace("-", " ").split())
+
+def link_players(gps, players):
+    """ whoscored playerId / name of every GPS row: same shirt number, else the one
+        player whose name tokens all appear in the GPS first and last names
+    """
+    by_shirt = {p["shirtNo"]: p for p in players if p.get("shirtNo") is not None}
+    ids, names, links = [], [], []
+    for shirt, first, last in gps[["shirt", "first_name", "last_name"]].itertuples(index=False):
+        tokens = normalize(f"{first} {last}")
+        player, link = by_shirt.get(int(shirt)), "shirt"
+        if player is None:
+            candidates = [p for p in players if normalize(p["name"]) <= tokens]
+            player, link = (candidates[0], "name") if len(candidates) == 1 else (None, None)
+        ids.append(player["playerId"] if player else np.nan)
+        names.append(player["name"] if player else None)
+        links.append(link)
+    return gps.assign(playerId=np.array(ids, dtype="float64"), player_name=names, link=links)
+
+def report_side(gps, meta):
+    """ "home" or "away": the team whose shirt numbers best match the GPS names"""
+    def agreement(side):
+        by_shirt = {p["shirtNo"]: normalize(p["name"]) for p in meta[side].get("players", [])}
+        return sum(bool(by_shirt.get(int(shirt), set()) & normalize(f"{first} {last}"))
+                   for shirt, first, last in gps[["shirt", "first_name", "last_name"]].itertuples(index=False))
+    return max(["home", "away"], key=agreement)
+
+def read_fixture(fixture):
+    """ the linked GPS rows of one fixture, tagged like the season frames"""
+    from season import match_name
+    meta = load_meta(fixture["json"])
+    gps = parse_report(workbooks.load_workbook(fixture["fitness"]))
+    side = report_side(gps, meta)
+    other = "away" if side == "home" else "home"
+    gps = link_players(gps, meta[side].get("players", []))
+    return gps.assign(match=match_name(fixture["json"]), team=meta[side]["name"], venue=side, opponent=meta[other]["name"])
+
+def fitness_fixtures():
+    return [fx for fx in catalogue.sync() if fx["fitness"]]
+
+def table_key(fixtures):
+    """ hash of the GPS files, the matches they are linked to and the code"""
+    h = hashlib.sha1(code_version(("fitness", "catalogue", "season")).encode())
+    for fx in fixtures:
+        h.update(f"{fx['json']}|{file_hash(fx['json'])}|{fx['fitness']}|{file_hash(fx['fitness'])}".encode())
+    return h.hexdigest()
+
+def build(fixtures, workers=None, executor=None):
+    """ the consolidated table; workbooks without a cached parse are parsed in parallel
+        first, in an `executor` pool (EXECUTOR by default)
+    """
+    missing = [fx["fitness"] for fx in fixtures
+               if not os.path.exists(workbooks.cache_path(fx["fitness"], False, False, file_hash(fx["fitness"])))]
+    if len(missing) > 1 and workers != 1:
+        with (executor or EXECUTOR)(max_workers=workers) as pool:
+            list(pool.map(workbooks.load_workbook, missing))
+    frames = [read_fixture(fx) for fx in fixtures]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(COLUMNS.values()))
+    for col in ["match", "team", "venue", "opponent", "link"]:
+        df[col] = df[col].astype("category")
+    return df
+
+def stored_key():
+    """ key of the stored table, None if its key file is missing or unreadable (e.g. an
+        interrupted write), which rebuilds the table
+    """
+    try:
+        with open(FITNESS_FILE + ".json") as f:
+            return json.load(f)["key"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+@memoize
+def _load(key):
+    if feather is not None and os.path.exists(FITNESS_FILE) and stored_key() == key:
+        return feather.read_feather(FITNESS_FILE)
+    df = build(fitness_fixtures())
+    if feather is not None:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        feather.write_feather(df, FITNESS_FILE + ".tmp", compression="uncompressed")
+        os.replace(FITNESS_FILE + ".tmp", FITNESS_FILE)
+        with open(FITNESS_FILE + ".json.tmp", "w") as f:
+            json.dump({"key": key, "rows": len(df)}, f)
+        os.replace(FITNESS_FILE + ".json.tmp", FITNESS_FILE + ".json")
+    return df
+
+@timed
+def load_fitness():
+    """ the consolidated GPS table: one row per player and match, with playerId and
+        player_name as in the event data; a copy, so callers can modify it
+    """
+    return _load(table_key(fitness_fixtures())).copy()
+
+def with_actions(fitness, actions, name):
+    """ fitness rows with the number of `actions` (a season frame with match and
+        player_name columns) of each player in each match as column `name`
+    """
+    counts = actions.groupby(["match", "player_name"]).size().rename(name).reset_index()
+    counts["match"] = counts["match"].astype(str)
+    out = fitness.assign(match=fitness["match"].astype(str)).merge(counts, on=["match", "player_name"], how="left")
+    out[name] = out[name].fillna(0).astype(int)
+    return out
+
+def match_load(match_file):
+    """ GPS rows of one match with the player's progressive passes, recoveries and
+        defensive actions in it, None if the match has no GPS report
+    """
+    from helpers import get_prog_passes, get_defensive_actions
+    from event_store import load_match
+    from season import match_name
+    fitness = load_fitness()
+    rows = fitness[fitness["match"] == match_name(match_file)]
+    if rows.empty:
+        return None
+    me = load_match(match_file)
+    side = rows["venue"].iloc[0]
+    recoveries = me.team_df(side).query("type_displayName == 'BallRecovery'")
+    for name, actions in [("prog_passes", get_prog_passes(me, side)), ("recoveries", recoveries),
+                          ("defensive_actions", get_defensive_actions(me, side))]:
+        rows = with_actions(rows, actions.assign(match=match_name(match_file)), name)
+    return rows[["player_name", "minutes", "distance", "distance_21", "sprints", "max_speed",
+                 "prog_passes", "recoveries", "defensive_actions"]].reset_index(drop=True)
+
+if __name__ == "__main__":
+    import time
+
+    from season import season_frames
+
+    EXECUTOR = ProcessPoolExecutor
+
+    for label in ["first call", "second call"]:
+        t = time.perf_counter()
+        fitness = load_fitness()
+        print(f"{label}: {len(fitness)} rows in {(time.perf_counter() - t)*1000:.0f} ms")
+    print(fitness["link"].value_counts(dropna=False).to_string(), "\n")
+
+    frames = season_frames()
+    joined = with_actions(with_actions(fitness, frames["prog_passes"], "prog_passes"), frames["recoveries"], "recoveries")
+    joined = joined[joined["team"] == TEAM]
+    per_player = joined.groupby("player_name")[["minutes", "sprints", "distance_21", "prog_passes", "recoveries"]].sum()
+    per_player["sprints_p90"] = per_player["sprints"] / per_player["minutes"] * 90
+    per_player["prog_passes_p90"] = per_player["prog_passes"] / per_player["minutes"] * 90
+    print(per_player[per_player["minutes"] >= 180].sort_values("sprints_p90", ascending=False).round(2).to_string())
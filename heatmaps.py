@@ -0,0 +1,110 @@
+""" event heatmaps built from the match events instead of pre-rendered PNGs
+
+    every event with a location is binned into an nx x ny pitch grid once per match,
+    one grid per (team, player, event type, period), with a single bincount over all
+    events. any filter (team, players, event types, halves) is then a sum over the
+    matching grids, and smooth() blurs the result with a small gaussian kernel
+
+    python heatmaps.py    binning and filter timings over the first team matches
+"""
+import numpy as np
+import plotly.graph_objs as go
+
+from helpers import match_events
+from instrument import timed
+
+BINS = (12, 8)  ##cells along, across the pitch
+DEFENSIVE_ACTIONS = ["Interception", "Clearance", "Tackle", "Foul", "Challenge"]
+PERIODS = {"Full match": None, "1st half": [1], "2nd half": [2]}
+KEY_COLUMNS = ["side", "player_name", "type_displayName", "period_value"]
+
+class HeatmapGrids():
+    """ per (side, player, event type, period) event count grids of one match"""
+
+    def __init__(self, keys, counts, bins=BINS):
+        self.keys = keys          ##one row per grid, KEY_COLUMNS
+        self.counts = counts      ##(len(keys), ny, nx) float32
+        self.bins = bins
+        self._values = {col: keys[col].values for col in KEY_COLUMNS}
+
+    @classmethod
+    @timed
+    def from_match(cls, md, bins=BINS):
+        me = match_events(md)
+        nx, ny = bins
+        df = me.df.assign(side=np.where(me.masks["home"], "home", "away"))
+        df = df[df["x"].notna() & df["y"].notna() & df["player_name"].notna()]
+        df = df.assign(type_displayName=df["type_displayName"].astype(str))
+
+        grouped = df.groupby(KEY_COLUMNS, sort=True)
+        key = grouped.ngroup().values
+        keys = grouped.size().index.to_frame(index=False)
+
+        ix = np.clip((df["x"].values * nx / 100).astype(int), 0, nx - 1)
+        iy = np.clip((df["y"].values * ny / 100).astype(int), 0, ny - 1)
+        flat = (key * ny + iy) * nx + ix
+        counts = np.bincount(flat, minlength=len(keys) * nx * ny).reshape(len(keys), ny, nx).astype(np.float32)
+        return cls(keys, counts, bins)
+
+    def mask(self, side=None, players=None, types=None, periods=None):
+        keep = np.ones(len(self.keys), dtype=bool)
+        for col, values in [("side", [side] if side else None), ("player_name", players),
+                            ("type_displayName", types), ("period_value", periods)]:
+            if values:
+                keep &= np.isin(self._values[col], values)
+        return keep
+
+    def total(self, side=None, players=None, types=None, periods=None):
+        """ (ny, nx) event counts of the grids matching every given filter"""
+        return self.counts[self.mask(side, players, types, periods)].sum(axis=0)
+
+    def players(self, side):
+        return sorted(self.keys.loc[self.keys["side"] == side, "player_name"].unique())
+
+    def types(self):
+        return sorted(self.keys["type_displayName"].unique())
+
+def gaussian_kernel(sigma):
+    radius = max(1, int(np.ceil(3 * sigma)))
+    k = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    return k / k.sum()
+
+def smooth(grid, sigma=1.0):
+    """ gaussian blur of a grid, sigma in cells; edges are extended, so no counts
+        leak off the pitch
+    """
+    if not sigma:
+        return grid
+    k = gaussian_kernel(sigma)
+    r = len(k) // 2
+    out = grid
+    for axis in (0, 1):
+        n = out.shape[axis]
+        padded = np.pad(out, [(r, r) if a == axis else (0, 0) for a in (0, 1)], mode="edge")
+        out = sum(w * np.take(padded, np.arange(j, j + n), axis=axis) for j, w in enumerate(k))
+    return out * (grid.sum() / out.sum() if out.sum() else 1)
+
+def heatmap_trace(grid, zmax=None, colorscale="RdBu_r"):
+    """ a grid as a plotly heatmap over the 0-100 pitch, one cell per bin"""
+    ny, nx = grid.shape
+    return go.Heatmap(z=grid, x=(np.arange(nx) + 0.5) * 100 / nx, y=(np.arange(ny) + 0.5) * 100 / ny,
+                      zmin=0, zmax=zmax, colorscale=colorscale, showscale=False, opacity=0.8,
+                      hovertemplate="%{z:.1f}<extra></extra>")
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    from event_store import MATCH_DIR, load_match
+
+    for mf in sorted(glob.glob(f"{MATCH_DIR}/*.json")):
+        me = load_match(mf)
+        t = time.perf_counter()
+        grids = HeatmapGrids.from_match(me)
+        built = time.perf_counter() - t
+        t = time.perf_counter()
+        for _ in range(100):
+            smooth(grids.total("home", types=DEFENSIVE_ACTIONS, periods=[1]), 1.0)
+        query = (time.perf_counter() - t) / 100
+        print(f"{mf:55} {len(me.df):5} events  {len(grids.keys):4} grids  built {built*1000:5.1f} ms  "
+              f"filter+smooth {query*1000:5.2f} ms")
@@ -1,13 +1,16 @@
-import pandas as pd
 from pandas import json_normalize
 import numpy as np
 
-from PIL import Image
-import json
-
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from qualifiers import QualifierIndex, SET_PIECE_QUALIFIERS
+from xt import score_events
+from duels import duel_pairs, duel_matrix
+from workbooks import load_workbook
+from instrument import timed
+
+@timed
 def prep_df(md):
     """ normalize to df, 
         add player names
@@ -22,15 +25,59 @@ def prep_df(md):
 
     return df
 
+class MatchEvents():
+    """ a match parsed once: normalized events, player names, team masks and the
+        qualifier index, shared by the helpers and PassMap instead of calling prep_df per plot
+    """
+
+    def __init__(self, md, df=None, qualifiers=None):
+        self.md = md
+        self.df = prep_df(md) if df is None else df
+        self.q = QualifierIndex.from_events(md["events"]) if qualifiers is None else qualifiers
+        self.player_names = {float(k):v for k,v in md["playerIdNameDictionary"].items()}
+        self.team_ids = {side: md[side]["teamId"] for side in ["home", "away"]}
+        self.masks = {side: (self.df["teamId"] == team_id).values for side, team_id in self.team_ids.items()}
+        self._chains = None
+
+    def __getitem__(self, key):
+        """ behave like the match dict for md["home"], md["playerIdNameDictionary"] etc.
+            md["events"] only exists when parsed from the json: a match read from the
+            columnar store keeps just the sidecar, so use .df (and .q) for the events
+        """
+        if key == "events" and key not in self.md:
+            raise KeyError('"events" is not kept for a match read from the event store, use .df and .q')
+        return self.md[key]
+
+    def team_df(self, side="home"):
+        """ events of one side"""
+        return self.df[self.masks[side]]
+
+    @property
+    def chains(self):
+        """ (chain id of every event, per-chain table) from possession.segment, computed once"""
+        if self._chains is None:
+            from possession import segment
+            self._chains = segment(self)
+        return self._chains
+
+def match_events(md):
+    """ accept either a raw match dict or an already parsed MatchEvents"""
+    if isinstance(md, MatchEvents):
+        return md
+    return MatchEvents(md)
+
+@timed
 def get_shots(md, side="home"):
     """returns a dataframe containing the shots """
     
-    team_id = md[side]["teamId"]    
-    df = prep_df(md)
+    me = match_events(md)
+    team_id = me.team_ids[side]
+    df = me.df
     shot_events = ["ShotOnPost", "MissedShots", "SavedShot", "Goal"]
     
     return df.query("type_displayName == @shot_events & teamId == @team_id")[["x", "y", "player_name", "minute"]]
 
+@timed
 def get_prog_passes(md, side="home"):
     """ returns a dataframe containing progressive passes
     Definition: 
@@ -40,12 +87,12 @@ def get_prog_passes(md, side="home"):
         open-play passes only
     """
 
-    team_id = md[side]["teamId"]
-    df = prep_df(md)
-    pass_df = df.query("type_displayName == 'Pass' & outcomeType_displayName == 'Successful' &\
-                        x>=40 & teamId == @team_id").copy()
+    me = match_events(md)
+    team_id = me.team_ids[side]
+    df = me.df
+    pass_df = df[~me.q.has(*SET_PIECE_QUALIFIERS)].query("type_displayName == 'Pass' & outcomeType_displayName == 'Successful' &\
+                        x>=40 & teamId == @team_id").reset_index(drop=True)
 
-    pass_df = pass_df[~pass_df['qualifiers'].str.contains('|'.join(["Corner", "Freekick", "Throw"]), regex=True)].reset_index(drop=True)          
     pass_df["length"] = np.sqrt(np.square(pass_df["x"] - pass_df["endX"]) + np.square(pass_df["y"] - pass_df["endY"]))
     pass_df["start_dist_to_goal"] = np.sqrt(np.square(pass_df["x"] - 100) + np.square(pass_df["y"] - 50)) 
     pass_df["end_dist_to_goal"] = np.sqrt(np.square(pass_df["endX"] - 100) + np.square(pass_df["endY"] - 50)) 
@@ -53,96 +100,66 @@ def get_prog_passes(md, side="home"):
 
     return pass_df.query("length>=10 & prog>=10")[["player_name", "minute", "x", "y", "endX", "endY"]]
 
+@timed
 def get_goalkicks(md, side="home"):
     """ returns goalkicks"""
 
-    team_id = md[side]["teamId"]
-    df = prep_df(md) 
-    df = df.query("teamId == @team_id")
+    me = match_events(md)
     
-    return df[df['qualifiers'].str.contains("GoalKick")].reset_index(drop=True)[["player_name", "minute", "x", "y", "endX", "endY"]] 
+    return me.df[me.q.has("GoalKick") & me.masks[side]].reset_index(drop=True)[["player_name", "minute", "x", "y", "endX", "endY"]] 
 
+@timed
 def get_xT(md, side="home"):
     """ calculates xT for passes using Karun's xT data and returns dataframe"""
 
-    team_id = md[side]["teamId"]
-    df = prep_df(md)
-
-    with open("static/expected_threat.json") as f:
-        xtd = np.array(json.load(f))
-    n_rows, n_cols = xtd.shape
+    me = match_events(md)
+    team_id = me.team_ids[side]
+    pass_df = score_events(me).query("teamId == @team_id")
 
-    pass_df = df.query("type_displayName == 'Pass' & outcomeType_displayName == 'Successful' &\
-                        teamId == @team_id")
-    pass_df = pass_df[~pass_df['qualifiers'].str.contains('|'.join(["Corner", "Freekick", "Throw"]), regex=True)].reset_index(drop=True)        
-
-    pass_df['x1_bin'] = pass_df["x"].apply(lambda val: int(val/(1/n_cols)) if val != 1 else int(val/(1/n_cols)) - 1 )
-    pass_df['x2_bin'] = pass_df["endX"].apply(lambda val: int(val/(1/n_cols)) if val != 1 else int(val/(1/n_cols)) - 1 )
-
-    pass_df['y1_bin'] = pass_df["y"].apply(lambda val: int(val/(1/n_rows)) if val != 1 else int(val/(1/n_rows)) - 1 )
-    pass_df['y2_bin'] = pass_df["endY"].apply(lambda val: int(val/(1/n_rows)) if val != 1 else int(val/(1/n_rows)) - 1 )                        
-
-    pass_df['start_zone_value'] = pass_df[['x1_bin', 'y1_bin']].apply(lambda x: xtd[x[1]][x[0]], axis=1)
-    pass_df['end_zone_value'] = pass_df[['x2_bin', 'y2_bin']].apply(lambda x: xtd[x[1]][x[0]], axis=1)
-    pass_df['pass_xt_value'] = pass_df['end_zone_value'] - pass_df['start_zone_value'] 
-
-    return pass_df.groupby(["player_name"]).agg(xt=("pass_xt_value", "sum")).reset_index().sort_values(by="xt")
+    return pass_df.groupby(["player_name"]).agg(xt=("xt", "sum")).reset_index().sort_values(by="xt")
 
+@timed
 def get_defensive_actions(md, side="home"):
 
-    team_id = md[side]["teamId"]
-    df = prep_df(md) 
+    me = match_events(md)
+    team_id = me.team_ids[side]
+    df = me.df
 
     return df.query("type_displayName == ['Interception', 'Clearance', 'Tackle', 'Foul', 'Challenge'] &\
                      teamId == @team_id")[["player_name", "minute", "x", "y", "endX", "endY"]] 
 
+@timed
 def get_ball_recoveries(md, side="home"):
 
-    team_id = md[side]["teamId"]
-    df = prep_df(md) 
+    me = match_events(md)
+    team_id = me.team_ids[side]
+    df = me.df
 
     pdf = df.query("type_displayName == 'BallRecovery' & teamId == @team_id")["player_name"] 
-    return pdf.value_counts().reset_index()
+    ##named explicitly: value_counts().reset_index() names its columns differently from pandas 2 on
+    return pdf.value_counts().rename_axis("player_name").rename("recoveries").reset_index()
 
+@timed
 def get_aerials_data(md):
-    df = prep_df(md)
-
-    cdf = df.query("type_displayName == 'Aerial'").copy()
-    aids = cdf.index
-    cdf["related_player"] = cdf["player_name"].shift(-1)
-    cdf = cdf.loc[aids[::2], ["player_name", "related_player", "outcomeType_value"]]
-    d = cdf.groupby(["player_name", "related_player"]).agg(count=("outcomeType_value", "size")).reset_index()
-    d = d.pivot(index="player_name", columns="related_player", values="count").fillna(0)
-
-    away_pls = [pl["name"] for pl in md["away"]["players"]]
-    home_pls = [pl["name"] for pl in md["home"]["players"]]
-
-    d = d[d.index.isin(home_pls)]
-    d = d[[col for col in d.columns if col in away_pls]]
-    d[d.columns] = d[d.columns].astype(int)
-    for i in d.index:
-        for j in d.columns:
-            if d.loc[i, j] != 0:
-                d.loc[i, j] = f"{d.loc[i, j]}/{np.random.randint(low=0, high=d.loc[i, j]+1)}"
-    return d
+    """ home x away players matrix of aerial duels as "duels/won by the home player" """
+    me = match_events(md)
+    return duel_matrix(duel_pairs(me, "aerial", side="home"))
 
+@timed
 def get_corners(md, side="home"):
-    df = prep_df(md)
-    team_id = md[side]["teamId"]
-    return df.loc[df.qualifiers.str.contains("CornerTaken") & (df.teamId == team_id)][["player_name", "x", "y", "endX", "endY"]]
+    me = match_events(md)
+    return me.df.loc[me.q.has("CornerTaken") & me.masks[side]][["player_name", "x", "y", "endX", "endY"]]
 
+@timed
 def get_b_figs(team):
     
     if team == "Villarreal B":
 
-        pdf = pd.read_excel('static/bc_teams/Vllarreal B players stats.xlsx', sheet_name=None, index_col=None)
-        df = pd.read_excel("static/bc_teams/Vill B.xlsx")    
+        pdf = load_workbook('static/bc_teams/Vllarreal B players stats.xlsx', all_sheets=True, clean=True)
+        df = load_workbook("static/bc_teams/Vill B.xlsx")    
     else:
-        pdf = pd.read_excel('static/bc_teams/Villarreal III_players.xlsx', sheet_name=None, index_col=None)
-        df = pd.read_excel("static/bc_teams/Vill C.xlsx")       
-
-    pdf = pd.concat(pdf.values())
-    pdf = pdf.replace("-", 0).fillna(0)
+        pdf = load_workbook('static/bc_teams/Villarreal III_players.xlsx', all_sheets=True, clean=True)
+        df = load_workbook("static/bc_teams/Vill C.xlsx")       
 
     fig_attacking = make_subplots(rows=2, cols=2)
     fig_attacking.update_layout(width=800, height=1200, showlegend=False)
@@ -230,9 +247,10 @@ def get_b_figs(team):
 
     return fig_attacking, fig_defending, fig_fitness
 
+@timed
 def get_c_fig(team):
 
-    df = pd.read_excel("static/bc_teams/Vill C.xlsx")
+    df = load_workbook("static/bc_teams/Vill C.xlsx")
     fig = make_subplots(rows=3, cols=2)
     fig.add_trace(go.Scatter(x=df.Accelerations, y=df.Decelerations, mode='markers', marker={'symbol': 'circle'}, 
                              text=df.Player, hovertemplate="<b>%{text}</b><extra></extra>"),
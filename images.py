@@ -0,0 +1,94 @@
+""" web-ready variants of the final_vizzes story PNGs
+
+    the PNGs are 2160-2640px wide RGBA images; sent as is, streamlit decodes and re-encodes
+    them to PNG on every rerun. each one is resized once to the widths below and stored
+    as WebP under static/final_vizzes/web/, and the encoded bytes are kept in memory, so a
+    page view sends a few tens of KB of ready bytes. the heatmaps are drawn from the events
+    (heatmaps.py), so their PNGs under static/final_vizzes/heatmaps are no longer converted
+
+    the variant follows the column the image is drawn in (COLUMN_WIDTHS): the main column
+    of the wide layout gets the 1400px variant, the sidebar the 400px thumbnail
+
+    python images.py    convert every image and print the bytes sent per page view
+"""
+import glob
+import io
+import os
+import sys
+
+from instrument import timed
+from shared_cache import memoize
+
+SOURCE_DIR = "static/final_vizzes"
+WEB_DIR = os.path.join(SOURCE_DIR, "web")
+COLUMN_WIDTHS = {"sidebar": 400, "main": 1400}  ##px the image is shown at in each streamlit column
+WIDTHS = sorted(COLUMN_WIDTHS.values())
+QUALITY = 85
+
+def variant_path(src, width):
+    rel = os.path.splitext(os.path.relpath(src, SOURCE_DIR))[0]
+    return os.path.join(WEB_DIR, f"{rel}-{width}.webp")
+
+def is_converted(src):
+    """ True if every variant of src exists and is newer than it, False if src is missing"""
+    if not os.path.exists(src):
+        return False
+    mtime = os.path.getmtime(src)
+    return all(os.path.exists(p) and os.path.getmtime(p) >= mtime for p in (variant_path(src, w) for w in WIDTHS))
+
+def convert(src):
+    """ write the WebP variants of one image"""
+    from PIL import Image ##only needed to convert, serving reads the stored bytes
+    im = Image.open(src)
+    for width in WIDTHS:
+        path = variant_path(src, width)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        resized = im.resize((width, round(im.height*width/im.width)), Image.LANCZOS) if im.width > width else im
+        tmp = f"{path}.{os.getpid()}.tmp"
+        resized.save(tmp, "WEBP", quality=QUALITY, method=6)
+        os.replace(tmp, path)
+
+@memoize
+def _read(path, mtime_ns):
+    with open(path, "rb") as f:
+        return f.read()
+
+@timed
+def image_bytes(src, width=COLUMN_WIDTHS["main"]):
+    """ encoded bytes of the smallest variant at least `width` px wide (the largest if
+        none is), converting src first if it has no up to date variants
+    """
+    if not is_converted(src):
+        convert(src)
+    width = min([w for w in WIDTHS if w >= width] or [max(WIDTHS)])
+    path = variant_path(src, width)
+    return _read(path, os.stat(path).st_mtime_ns)
+
+def story_image(match_file):
+    """ story source PNG of a match file (which may not exist yet)"""
+    name = os.path.splitext(os.path.basename(match_file))[0]
+    return os.path.join(SOURCE_DIR, f"{name}.png")
+
+def png_bytes(src):
+    """ size of what st.image sends for Image.open(src): the image re-encoded as PNG"""
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.open(src).save(buf, "PNG")
+    return len(buf.getvalue())
+
+def source_files():
+    """ the story PNGs, the only images the page and the export show"""
+    return sorted(glob.glob(os.path.join(SOURCE_DIR, "*.png")))
+
+if __name__ == "__main__":
+    sources = sys.argv[1:] or source_files()
+    for src in sources:
+        if not is_converted(src):
+            convert(src)
+
+    ##a Senior Team page view sends the story of one match, the thumbnail when it is collapsed
+    for story in sources:
+        before, after = png_bytes(story), len(image_bytes(story))
+        thumbnail = len(image_bytes(story, width=COLUMN_WIDTHS["sidebar"]))
+        print(f"{os.path.basename(story):45} before {before/1024:7.1f} KB  after {after/1024:6.1f} KB  "
+              f"collapsed {thumbnail/1024:5.1f} KB")
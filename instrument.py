@@ -0,0 +1,134 @@
+""" per-rerun timing and cache instrumentation
+
+    functions decorated with @timed (the loaders, helpers extractors, PassMap, the
+    pitch drawing) and explicit record() calls (cache hits and misses, rendered
+    sections) add one record each to the current rerun: wall time, rows processed,
+    figure trace count, serialized size and cache outcome; span() does the same for
+    a block of code. nothing is recorded unless the rerun was started with start_run(),
+    so the cost outside a debug rerun is one attribute lookup per call. records are
+    collected per thread, so the background prebuild does not end up in a page's numbers
+
+    finish_run() writes every record as one json log line on the "dashboard.timings"
+    logger (INSTRUMENT_LOG=<file> sends them to a file) for aggregation across sessions
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+ALWAYS = os.environ.get("INSTRUMENT", "") == "1"  ##record and log every rerun, not only debug ones
+
+logger = logging.getLogger("dashboard.timings")
+if os.environ.get("INSTRUMENT_LOG"):
+    _handler = logging.FileHandler(os.environ["INSTRUMENT_LOG"])
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_local = threading.local()
+
+def session_id():
+    """ streamlit session of the running script, None outside streamlit"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        try:
+            from streamlit.report_thread import get_report_ctx as get_script_run_ctx ##streamlit < 1.x
+        except ImportError:
+            return None
+    ctx = get_script_run_ctx()
+    return getattr(ctx, "session_id", None)
+
+def start_run(enabled=True):
+    """ start collecting records for this rerun (if enabled or INSTRUMENT=1)"""
+    _local.records = [] if enabled or ALWAYS else None
+    _local.depth = 0
+    _local.run = {"run": uuid.uuid4().hex[:12], "session": session_id(), "start": time.time()}
+
+def active():
+    return getattr(_local, "records", None) is not None
+
+def record(name, **fields):
+    """ add one record to the current rerun, if any"""
+    if active():
+        _local.records.append(dict(name=name, depth=_local.depth, **fields))
+
+def describe(args, out):
+    """ rows / traces / bytes of a result, and the events of a MatchEvents argument"""
+    fields = {}
+    source = getattr(args[0], "md", args[0]) if args else None
+    if hasattr(source, "df"):
+        fields["events"] = len(source.df)
+    if hasattr(out, "df"):
+        fields["rows"] = len(out.df)
+    elif isinstance(out, (pd.DataFrame, pd.Series)):
+        fields["rows"] = len(out)
+    elif isinstance(out, bytes):
+        fields["bytes"] = len(out)
+    elif isinstance(out, dict) and "data" in out:
+        fields["traces"] = len(out["data"])
+    elif hasattr(out, "data") and hasattr(out, "layout"):
+        fields["traces"] = len(out.data)
+    return fields
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """ time the block as one record, nested records get depth + 1;
+        yields the record's fields so the block can add to them (e.g. cache="hit")
+    """
+    if not active():
+        yield fields
+        return
+    _local.depth += 1
+    t = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        _local.depth -= 1
+        record(name, seconds=time.perf_counter() - t, **fields)
+
+def timed(fn=None, name=None):
+    """ decorator recording the wall time and result size of every call made during a rerun"""
+    def wrap(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not active():
+                return fn(*args, **kwargs)
+            with span(label) as fields:
+                out = fn(*args, **kwargs)
+                fields.update(describe(args, out))
+            return out
+        return wrapper
+    return wrap(fn) if fn is not None else wrap
+
+def serialized_size(obj):
+    """ bytes of the json a figure (object or dict) or table is sent as"""
+    if isinstance(obj, pd.DataFrame):
+        return len(obj.to_json(orient="split"))
+    if isinstance(obj, dict):
+        return len(json.dumps(obj))
+    return len(obj.to_json())
+
+def render_fields(obj):
+    """ traces and serialized size of a section handed to the browser"""
+    return dict(describe((), obj), bytes=serialized_size(obj)) if active() else {}
+
+def finish_run():
+    """ stop collecting, log every record as a json line and return them as a dataframe"""
+    records = getattr(_local, "records", None)
+    _local.records = None
+    if records is None:
+        return None
+    run = dict(_local.run, total_seconds=time.time() - _local.run["start"])
+    for r in records:
+        logger.info(json.dumps(dict(run, **r), default=str))
+    columns = ["name", "depth", "seconds", "cache", "events", "rows", "traces", "bytes"]
+    return pd.DataFrame(records).reindex(columns=columns)
@@ -0,0 +1,133 @@
+""" pass networks for several time windows of a match in one pass over the events
+
+    the receiver of a completed open-play pass is the next event of the same team
+    that has a player, in the same period. every pass is labelled with its window
+    in each scheme (full match, half, 15 minute block, between substitutions) and
+    nodes and links of all windows come out of one groupby each. substitutes are
+    included like any other player
+
+    python passnet.py    print the windows and their link counts for one match
+"""
+import numpy as np
+import pandas as pd
+
+from qualifiers import SET_PIECE_QUALIFIERS
+
+SCHEMES = ["full", "half", "15min", "subs"]
+BLOCKS = ["0-15", "15-30", "30-45+", "45-60", "60-75", "75-90+", "extra time"]
+HALVES = ["1st half", "2nd half", "extra time"]
+
+def min_max(values, lo=0.1, hi=0.9):
+    """ values rescaled linearly to [lo, hi]; all lo if they are all equal"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return values
+    span = values.max() - values.min()
+    return lo + (values - values.min()) * (hi - lo) / (span if span else 1)
+
+def pass_receivers(me, side="home"):
+    """ completed open-play passes of one side with their receiver"""
+    df = me.df
+    side_mask = me.masks[side]
+    completed = ((df["type_displayName"] == "Pass") & (df["outcomeType_displayName"] == "Successful")).values
+    completed &= side_mask & ~me.q.has(*SET_PIECE_QUALIFIERS)
+
+    candidates = np.flatnonzero(side_mask & df["playerId"].notnull().values)
+    rows = np.flatnonzero(completed)
+    nxt = np.searchsorted(candidates, rows, side="right")
+    rows, receivers = rows[nxt < len(candidates)], candidates[nxt[nxt < len(candidates)]]
+
+    period, player = df["period_value"].values, df["playerId"].values
+    keep = (period[receivers] == period[rows]) & (player[receivers] != player[rows])
+    rows, receivers = rows[keep], receivers[keep]
+
+    passes = df.iloc[rows][["playerId", "player_name", "period_value", "minute", "second", "x", "y", "endX", "endY"]]
+    passes = passes.assign(row=rows, receiver_id=player[receivers]).reset_index(drop=True)
+    passes["receiver_name"] = passes["receiver_id"].map(me.player_names)
+    return passes
+
+def window_labels(me, passes, side="home"):
+    """ {scheme: window label of every pass}"""
+    period, minute = passes["period_value"].values, passes["minute"].values
+    block = minute // 15
+    block = np.where(period == 1, np.minimum(block, 2), np.where(period == 2, np.clip(block, 3, 5), 6))
+
+    df = me.df
+    subs = np.flatnonzero((df["type_displayName"] == "SubstitutionOn").values & me.masks[side])
+    n_subs = np.searchsorted(subs, passes["row"].values)
+    sub_minutes = np.char.add(np.char.add("from ", df["minute"].values[subs].astype(str)), "'")
+
+    return {"full": np.full(len(passes), "full match", dtype=object),
+            "half": np.array(HALVES, dtype=object)[np.clip(period - 1, 0, 2)],
+            "15min": np.array(BLOCKS, dtype=object)[block],
+            "subs": np.where(n_subs == 0, "starting XI", np.append(sub_minutes, "")[n_subs - 1]).astype(object)}
+
+def networks(me, side="home"):
+    """ pass networks of every window of every scheme
+
+        returns {"nodes": scheme, window, playerId, player_name, x, y (mean pass origin), num (passes),
+                 "links": scheme, window, player_a, player_b, count (passes either way),
+                 "windows": {scheme: window labels in match order}}
+    """
+    passes = pass_receivers(me, side)
+    labels = window_labels(me, passes, side)
+    long = pd.concat([passes.assign(scheme=scheme, window=labels[scheme]) for scheme in SCHEMES], ignore_index=True)
+
+    nodes = (long.groupby(["scheme", "window", "playerId", "player_name"], sort=False)
+                 .agg(x=("x", "mean"), y=("y", "mean"), num=("x", "size")).reset_index())
+    long["player_a"] = np.minimum(long["playerId"].values, long["receiver_id"].values)
+    long["player_b"] = np.maximum(long["playerId"].values, long["receiver_id"].values)
+    links = long.groupby(["scheme", "window", "player_a", "player_b"], sort=False).size().reset_index(name="count")
+
+    windows = {scheme: list(pd.unique(labels[scheme])) for scheme in SCHEMES}
+    return {"nodes": nodes, "links": links, "windows": windows}
+
+def window_network(network, scheme="full", window="full match"):
+    """ (nodes, links) of one window, links with both players' positions (px, py, rx, ry)"""
+    nodes = network["nodes"]
+    nodes = nodes[(nodes["scheme"] == scheme) & (nodes["window"] == window)]
+    links = network["links"]
+    links = links[(links["scheme"] == scheme) & (links["window"] == window)]
+
+    pos = nodes.set_index("playerId")[["x", "y"]]
+    links = (links.join(pos.rename(columns={"x": "px", "y": "py"}), on="player_a")
+                  .join(pos.rename(columns={"x": "rx", "y": "ry"}), on="player_b")
+                  .dropna(subset=["px", "rx"]))
+    return nodes.reset_index(drop=True), links.reset_index(drop=True)
+
+def sub_start(window):
+    """ minute a "subs" window starts at: 0 for the starting XI, m for "from m'" """
+    return 0 if window == "starting XI" else int(window[len("from "):-1])
+
+def window_options(network_list, scheme):
+    """ windows of a scheme over several networks (both teams), in match order"""
+    windows = set(w for network in network_list for w in network["windows"][scheme])
+    if scheme == "subs":
+        return sorted(windows, key=sub_start)
+    order = {"full": ["full match"], "half": HALVES, "15min": BLOCKS}[scheme]
+    return [w for w in order if w in windows]
+
+def window_in_force(network, scheme, window):
+    """ the network's own window for a label from window_options: in the "subs" scheme each
+        team changes at its own minutes, so that is its last window started by then
+    """
+    if scheme != "subs" or window in network["windows"][scheme]:
+        return window
+    started = [w for w in network["windows"][scheme] if sub_start(w) <= sub_start(window)]
+    return started[-1] if started else "starting XI"
+
+if __name__ == "__main__":
+    import sys
+    import glob
+    import time
+    from event_store import load_match
+
+    match_file = sys.argv[1] if len(sys.argv) > 1 else sorted(glob.glob("static/first_team/*.json"))[0]
+    me = load_match(match_file)
+    t = time.perf_counter()
+    network = networks(me, "home")
+    print(f"{match_file}: {(time.perf_counter() - t)*1000:.1f} ms")
+    for scheme, windows in network["windows"].items():
+        for window in windows:
+            nodes, links = window_network(network, scheme, window)
+            print(f"{scheme:6} {window:15} {len(nodes):3} players {links['count'].sum():4} passes")
@@ -1,3 +1,15 @@
+""" pitch markings and the marker / segment layers drawn on them
+
+    layers are drawn as go.Scatter (SVG) up to WEBGL_POINTS points and as go.Scattergl
+    (WebGL) above it, so a season of passes does not stall the browser; the markings are
+    layout shapes in the same data coordinates, so they line up with either. PITCH_RENDER
+    forces "svg" or "webgl", and PITCH_MAX_POINTS thins every layer to an evenly spaced
+    subsample on the server before it is serialized (0, the default, keeps every point)
+
+    python pitch_plotly.py    build time and payload of a pass layer at 1k, 10k and 100k points
+"""
+import os
+
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 
@@ -5,20 +17,132 @@ import numpy as np
 import pandas as pd
 
 import json
+from functools import lru_cache
 
+from instrument import timed
+
+RENDER = os.environ.get("PITCH_RENDER", "auto")  ##"auto", "svg" or "webgl"
+WEBGL_POINTS = int(os.environ.get("PITCH_WEBGL_POINTS", "1000"))
+MAX_POINTS = int(os.environ.get("PITCH_MAX_POINTS", "0"))
+
+@lru_cache(maxsize=None)
 def ellipse_arc(x_center=0, y_center=0, a=1, b =1, start_angle=0, end_angle=2*np.pi, N=100, closed= False):
     t = np.linspace(start_angle, end_angle, N)
-    x = x_center + a*np.cos(t)
-    y = y_center + b*np.sin(t)
-    path = f'M {x[0]}, {y[0]}'
-    for k in range(1, len(t)):
-        path += f'L{x[k]}, {y[k]}'
+    x = np.char.mod('%.3f', x_center + a*np.cos(t))
+    y = np.char.mod('%.3f', y_center + b*np.sin(t))
+    path = 'M ' + ' L'.join(np.char.add(np.char.add(x, ', '), y))
     if closed:
         path += ' Z'
     return path    
 
+@lru_cache(maxsize=None)
+def pitch_shapes(color='silver'):
+    """ pitch markings as layout shapes in data coordinates, built once per color;
+        plot_pitch stamps them onto a subplot by adding its xref/yref
+    """
+    line = {"color":color, "width":1}
+    def rect(x0, y0, x1, y1):
+        return {"type":"rect", "x0":x0, "y0":y0, "x1":x1, "y1":y1, "line":line}
+    def spot(x, y, rx=0.5, ry=0.8):
+        return {"type":"circle", "x0":x-rx, "y0":y-ry, "x1":x+rx, "y1":y+ry, "line":line, "fillcolor":color}
+
+    shapes = [rect(0, 0, 100, 100),                                    ##outer box
+              rect(0, 21.1, 17, 78.9), rect(83, 21.1, 100, 78.9),      ##penalty boxes
+              rect(0, 36.8, 5.8, 63.2), rect(94.2, 36.8, 100, 63.2),   ##six-yard boxes
+              {"type":"line", "x0":50, "y0":0, "x1":50, "y1":100, "line":line},
+              {"type":"line", "x0":0, "y0":45.2, "x1":0, "y1":54.8, "line":{"color":color, "width":5}},
+              {"type":"line", "x0":100, "y0":45.2, "x1":100, "y1":54.8, "line":{"color":color, "width":5}},
+              {"type":"circle", "x0":41.3, "y0":36.5, "x1":58.7, "y1":63.5, "line":line},  ##9.15m on a 105x68 pitch
+              spot(50, 50), spot(11.5, 50), spot(88.5, 50),
+              {"type":"path", "path":ellipse_arc(x_center=17, y_center=50, a=1.2, b=7, start_angle=-np.pi/2, end_angle=np.pi/2, N=60),
+               "line":line},
+              {"type":"path", "path":ellipse_arc(x_center=83, y_center=50, a=1.2, b=7, start_angle=np.pi/2, end_angle=np.pi*1.5, N=60),
+               "line":line}]
+    for shape in shapes:
+        shape["layer"] = "below"
+    return tuple(shapes)
+
+def subplot_refs(fig, nr, nc):
+    """ (xref, yref) of a make_subplots cell, e.g. ("x3", "y3")"""
+    subplot = fig.get_subplot(nr, nc)
+    return "x" + subplot.xaxis.plotly_name[5:], "y" + subplot.yaxis.plotly_name[5:]
+
+def segments(x0, y0, x1, y1):
+    """ NaN-separated coordinates so many line segments can be drawn as one trace; NaN
+        serializes to the same null gaps as None, but keeps the arrays float, which plotly
+        writes to json ~50x faster than object arrays at season sizes
+    """
+    n = len(x0)
+    xs, ys = np.full(3*n, np.nan), np.full(3*n, np.nan)
+    xs[0::3], xs[1::3] = x0, x1
+    ys[0::3], ys[1::3] = y0, y1
+    return xs, ys
+
+def render_mode(n, render=None):
+    """ "webgl" for a layer of more than WEBGL_POINTS points (or whatever render or
+        PITCH_RENDER forces), else "svg"
+    """
+    render = render or RENDER
+    if render == "auto":
+        return "webgl" if n > WEBGL_POINTS else "svg"
+    return render
+
+def scatter_class(n, render=None):
+    return go.Scattergl if render_mode(n, render) == "webgl" else go.Scatter
+
+def decimate(n, max_points=None):
+    """ positions of an evenly spaced, ordered subsample of at most max_points of n rows
+        (every row when max_points is 0)
+    """
+    max_points = MAX_POINTS if max_points is None else max_points
+    if not max_points or n <= max_points:
+        return np.arange(n)
+    return np.linspace(0, n - 1, max_points).astype(int)
 
-def plot_pitch(fig, nr, nc, color='silver'):
+def _thin(values, keep):
+    values = values.values if hasattr(values, "values") else np.asarray(values)
+    return values if len(keep) == len(values) else values[keep]
+
+def plot_segments(fig, x0, y0, x1, y1, nr, nc, color, width=2, opacity=1, render=None, max_points=None):
+    """ draw every (x0, y0)->(x1, y1) segment of one style as a single trace"""
+    if len(x0) == 0:
+        return fig
+    keep = decimate(len(x0), max_points)
+    xs, ys = segments(*[_thin(v, keep) for v in (x0, y0, x1, y1)])
+    trace = scatter_class(len(keep), render)
+    fig.add_trace(trace(x=xs, y=ys, mode='lines', opacity=opacity, line={"color":color, "width":width},
+                        hoverinfo='none'), row=nr, col=nc)
+    return fig
+
+def plot_markers(fig, x, y, nr, nc, text=None, hovertext=None, render=None, max_points=None, **kwargs):
+    """ draw one marker layer as a single trace, WebGL when it is dense; text and hovertext
+        (player names) are thinned with the points
+    """
+    keep = decimate(len(x), max_points)
+    labels = {k: _thin(v, keep) for k, v in [("text", text), ("hovertext", hovertext)] if v is not None}
+    trace = scatter_class(len(keep), render)
+    fig.add_trace(trace(x=_thin(x, keep), y=_thin(y, keep), mode='markers', **labels, **kwargs), row=nr, col=nc)
+    return fig
+
+@timed
+def plot_pitches(fig, cells, color='silver'):
+    """ stamp the pitch template onto several (nr, nc) subplots with a single
+        layout update; plotly revalidates every existing shape on each update
+    """
+    stamped = []
+    for nr, nc in cells:
+        xref, yref = subplot_refs(fig, nr, nc)
+        stamped += [dict(shape, xref=xref, yref=yref) for shape in pitch_shapes(color)]
+    fig.layout.shapes = fig.layout.shapes + tuple(stamped)
+    return fig
+
+@timed
+def plot_pitch(fig, nr, nc, color='silver', as_traces=False):
+    """ stamp the cached pitch template onto subplot (nr, nc) as layout shapes,
+        or add the markings as traces (as_traces=True) for exports that need them
+    """
+    if not as_traces:
+        return plot_pitches(fig, [(nr, nc)], color=color)
 
     points = go.Scatter(x=[50, 11.5, 88.5], y=[50, 50, 50], marker={"color":color}, mode="markers", hoverinfo='none')
 
@@ -55,3 +179,27 @@ def plot_pitch(fig, nr, nc, color='silver'):
     
 
     return fig
+
+if __name__ == "__main__":
+    import time
+
+    from season import season_frames
+
+    ##season progressive passes resampled (with jitter) to each size, on one pitch
+    passes = season_frames()["prog_passes"]
+    rng = np.random.default_rng(0)
+    plot_pitches(make_subplots(rows=1, cols=1), [(1, 1)])  ##first use of the plotly validators
+    cols = ["x", "y", "endX", "endY"]
+    for n in [1_000, 10_000, 100_000]:
+        layer = passes[cols].values[rng.integers(len(passes), size=n)] + rng.normal(0, 1, (n, 4))
+        for render, max_points in [("svg", 0), ("auto", 0), ("auto", 10_000)]:
+            t = time.perf_counter()
+            fig = plot_pitches(make_subplots(rows=1, cols=1), [(1, 1)], color="black")
+            fig = plot_segments(fig, *layer.T, nr=1, nc=1, color="red", render=render, max_points=max_points)
+            fig = plot_markers(fig, layer[:, 0], layer[:, 1], nr=1, nc=1, marker={"color": "red"},
+                               render=render, max_points=max_points)
+            built = time.perf_counter() - t
+            payload = fig.to_json()
+            print(f"{n:7} passes  {render:4} max_points={max_points:<6} -> {fig.data[-1].type:9} "
+                  f"{len(fig.data[-1].x):7} markers  build {built*1000:6.0f} ms  "
+                  f"json {(time.perf_counter() - t - built)*1000:5.0f} ms  {len(payload)/2**20:5.1f} MB")
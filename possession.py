@@ -0,0 +1,124 @@
+""" possession chains: which spell of possession every event belongs to
+
+    segment() sorts the events by period and clock, keeps the on-ball events
+    (POSSESSION_TYPES) and starts a new chain on each of them where the team changes,
+    the period changes, a stoppage (foul, offside, corner awarded, goal, ...) happened
+    since the previous on-ball event, or play restarts from a set piece. the other events
+    (fouls, aerials, tackles, saves, ...) join the chain in progress. everything is one
+    pass of array comparisons and cumulative sums, no loop over events
+
+    each match gets the chain id of every event and a per-chain table (team, start/end
+    location and time, duration, passes, final third actions, outcome); MatchEvents.chains
+    computes both once per match and season.py caches the tables per match on disk
+
+    python possession.py    chain counts and outcomes per match, and the season metrics
+"""
+import numpy as np
+import pandas as pd
+
+from helpers import match_events
+from instrument import timed
+
+POSSESSION_TYPES = ["Pass", "BallTouch", "TakeOn", "Dispossessed", "BallRecovery", "Interception", "Clearance",
+                    "KeeperPickup", "Claim", "Smother", "MissedShots", "SavedShot", "ShotOnPost", "Goal"]
+STOPPAGE_TYPES = ["Foul", "OffsideGiven", "CornerAwarded", "Card", "SubstitutionOff", "SubstitutionOn",
+                  "FormationChange", "Goal", "Start", "End"]
+RESTART_QUALIFIERS = ["CornerTaken", "FreekickTaken", "IndirectFreekickTaken", "DirectFreekick", "ThrowIn", "GoalKick"]
+SHOT_TYPES = ["MissedShots", "SavedShot", "ShotOnPost", "Goal"]
+FINAL_THIRD = 200 / 3
+
+##why the next chain started -> how this one ended
+ENDINGS = {"turnover": "lost", "stoppage": "stoppage", "period": "end"}
+
+@timed
+def segment(md):
+    """ (chain id of every event as a Series aligned with me.df, -1 outside any chain,
+        per-chain table indexed by chain id)
+    """
+    me = match_events(md)
+    df = me.df
+    n = len(df)
+    second = df["second"].fillna(0).values  ##whoscored omits it on OffsideGiven; NaN would sort it last in its minute
+    order = np.lexsort((np.arange(n), second, df["minute"].values, df["period_value"].values))
+    types = df["type_displayName"].astype(str).values[order]
+    period = df["period_value"].values[order]
+
+    stop = np.isin(types, STOPPAGE_TYPES)
+    stops_before = np.cumsum(stop) - stop  ##a goal ends its own chain, not the one it belongs to
+    restart = me.q.has(*RESTART_QUALIFIERS)[order]
+
+    p = np.flatnonzero(np.isin(types, POSSESSION_TYPES))  ##on-ball events, in sorted order
+    team, p_period = df["teamId"].values[order][p], period[p]
+    new_period = np.r_[True, p_period[1:] != p_period[:-1]]
+    new_stop = np.r_[False, stops_before[p][1:] != stops_before[p][:-1]] | restart[p]
+    new_team = np.r_[False, team[1:] != team[:-1]]
+    starts = np.flatnonzero(new_period | new_stop | new_team)
+
+    ##chain of the on-ball events, then carried forward (and back, before a period's first) within the period
+    sorted_ids = pd.Series(np.nan, index=np.arange(n))
+    sorted_ids.iloc[p] = np.cumsum(new_period | new_stop | new_team) - 1
+    sorted_ids = sorted_ids.groupby(period).ffill().groupby(period).bfill().fillna(-1).astype(int).values
+    ids = np.empty(n, dtype=int)
+    ids[order] = sorted_ids
+
+    on_ball = df.iloc[order[p]]
+    ends = np.r_[starts[1:], len(p)] - 1
+    first, last = on_ball.iloc[starts], on_ball.iloc[ends]
+    t = (on_ball["minute"].values * 60 + on_ball["second"].values).astype(float)
+    p_types = types[p]
+    reduce = lambda mask: np.add.reduceat(mask.astype(int), starts) if len(starts) else np.zeros(0, dtype=int)
+
+    goals, shots = reduce(p_types == "Goal"), reduce(np.isin(p_types, SHOT_TYPES))
+    reason = np.where(new_period, "period", np.where(new_stop, "stoppage", "turnover"))[starts]
+    ending = np.array([ENDINGS[r] for r in reason[1:]] + ["end"], dtype=object)[:len(starts)]
+    end_x = np.where(last["endX"].notna(), last["endX"], last["x"])
+    end_y = np.where(last["endY"].notna(), last["endY"], last["y"])
+
+    chains = pd.DataFrame({"teamId": team[starts],
+                           "side": np.where(team[starts] == me.team_ids["home"], "home", "away"),
+                           "period": p_period[starts],
+                           "start_minute": first["minute"].values, "start_second": first["second"].values,
+                           "duration": t[ends] - t[starts],
+                           "start_x": first["x"].values, "start_y": first["y"].values, "end_x": end_x, "end_y": end_y,
+                           "events": np.bincount(ids[ids >= 0], minlength=len(starts)),
+                           "passes": reduce(p_types == "Pass"),
+                           "completed_passes": reduce((p_types == "Pass") & (on_ball["outcomeType_displayName"].values == "Successful")),
+                           "final_third": reduce(on_ball["x"].values >= FINAL_THIRD),
+                           "outcome": np.where(goals > 0, "goal", np.where(shots > 0, "shot", ending))})
+    chains.index.name = "chain"
+    return pd.Series(ids, index=df.index, name="chain"), chains
+
+def build_up_speed(chains, min_passes=3):
+    """ median forward speed (pitch units per second) of the chains with at least min_passes
+        passes that moved the ball forward, per match and team when tagged, else per side
+    """
+    keys = ["match", "team"] if "match" in chains else ["side"]
+    moved = chains[(chains["passes"] >= min_passes) & (chains["end_x"] > chains["start_x"]) & (chains["duration"] > 0)]
+    speed = (moved["end_x"] - moved["start_x"]) / moved["duration"]
+    return speed.groupby([moved[k] for k in keys]).median().rename("build_up_speed")
+
+def field_tilt(chains):
+    """ share of the match's final third actions made by each team (0-1)"""
+    keys = ["match", "team"] if "match" in chains else ["side"]
+    actions = chains.groupby(keys)["final_third"].sum()
+    if "match" in chains:
+        return (actions / actions.groupby(level="match").transform("sum")).rename("field_tilt")
+    return (actions / actions.sum()).rename("field_tilt")
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    from event_store import MATCH_DIR, load_match
+    from season import season_frames
+
+    for mf in sorted(glob.glob(f"{MATCH_DIR}/*.json")):
+        me = load_match(mf)
+        t = time.perf_counter()
+        ids, chains = segment(me)
+        took = time.perf_counter() - t
+        outcomes = chains["outcome"].value_counts().to_dict()
+        print(f"{mf:55} {len(chains):4} chains in {took*1000:5.1f} ms  {outcomes}")
+
+    chains = season_frames()["chains"]
+    print(pd.concat([build_up_speed(chains), field_tilt(chains)], axis=1).loc[lambda d: d.index.get_level_values("team") == "Villarreal"].round(3).to_string())
@@ -0,0 +1,101 @@
+""" whoscored qualifiers parsed once into an index
+
+    every event carries a list of qualifiers like
+    {"type": {"value": 6, "displayName": "CornerTaken"}, "value": "..."}.
+    QualifierIndex keeps one boolean column per qualifier type (flags) and a
+    sparse long table of the qualifiers that carry a value (OppositeRelatedEvent,
+    Zone, Length, ...), so filters become mask lookups instead of regexes over
+    the stringified lists.
+
+    python qualifiers.py    benchmark the index against the str.contains path
+"""
+import numpy as np
+import pandas as pd
+
+##qualifier types whose name contains Corner, Freekick or Throw, i.e. what the
+##old str.contains("Corner|Freekick|Throw") filter excluded from open play
+SET_PIECE_QUALIFIERS = ["CornerTaken", "FromCorner", "FreekickTaken", "IndirectFreekickTaken",
+                        "DirectFreekick", "ThrowIn", "KeeperThrow"]
+
+class QualifierIndex():
+    """ boolean flag per qualifier type and sparse qualifier values for one match"""
+
+    def __init__(self, table, n_events):
+        """ table: one row per qualifier with the event's row position (event),
+            type_value, type_displayName and value (None when it has no value)
+        """
+        self.table = table
+        self.n_events = n_events
+        names = table.drop_duplicates("type_displayName")
+        self.ids = dict(zip(names["type_displayName"], names["type_value"].astype(int)))
+
+        columns = sorted(self.ids)
+        flags = np.zeros((n_events, len(columns)), dtype=bool)
+        flags[table["event"].values, pd.Categorical(table["type_displayName"], categories=columns).codes] = True
+        self.flags = pd.DataFrame(flags, columns=columns)
+        self.values = table[table["value"].notnull()].reset_index(drop=True)
+
+    @classmethod
+    def from_events(cls, events):
+        """ build the index from the raw whoscored event list"""
+        rows, ids, names, values = [], [], [], []
+        for i, ev in enumerate(events):
+            for q in ev.get("qualifiers", []):
+                rows.append(i)
+                ids.append(q["type"]["value"])
+                names.append(q["type"]["displayName"])
+                values.append(q.get("value"))
+        table = pd.DataFrame({"event": np.array(rows, dtype=np.int64), "type_value": np.array(ids, dtype=np.int16),
+                              "type_displayName": names, "value": values})
+        return cls(table, len(events))
+
+    def has(self, *names):
+        """ boolean array over the events: True where any of the qualifiers is present"""
+        mask = np.zeros(self.n_events, dtype=bool)
+        for name in names:
+            if name in self.flags:
+                mask |= self.flags[name].values
+        return mask
+
+    def value(self, name):
+        """ values of one qualifier type as a Series indexed by event row"""
+        v = self.values[self.values["type_displayName"] == name]
+        return pd.Series(v["value"].values, index=v["event"].values, name=name)
+
+def bench(repeat=20):
+    """ time the open-play/goal-kick/corner filters with regexes vs the index"""
+    import glob
+    import json
+    import time
+    from pandas import json_normalize
+
+    print(f"{'match':40} {'regex ms':>9} {'index ms':>9} {'build ms':>9}")
+    for mf in sorted(glob.glob("static/first_team/*.json")):
+        with open(mf) as f:
+            md = json.load(f)
+        df = json_normalize(md["events"], sep="_")
+
+        t = time.perf_counter()
+        for _ in range(repeat):
+            s = df["qualifiers"].astype(str)
+            s.str.contains('|'.join(["Corner", "Freekick", "Throw"]), regex=True)
+            s.str.contains("GoalKick")
+            s.str.contains("CornerTaken")
+        regex = (time.perf_counter() - t) / repeat
+
+        t = time.perf_counter()
+        for _ in range(repeat):
+            qi = QualifierIndex.from_events(md["events"])
+        build = (time.perf_counter() - t) / repeat
+
+        t = time.perf_counter()
+        for _ in range(repeat):
+            qi.has(*SET_PIECE_QUALIFIERS)
+            qi.has("GoalKick")
+            qi.has("CornerTaken")
+        lookup = (time.perf_counter() - t) / repeat
+
+        print(f"{mf.split('/')[-1][:40]:40} {regex*1000:9.2f} {lookup*1000:9.3f} {build*1000:9.2f}")
+
+if __name__ == "__main__":
+    bench()
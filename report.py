@@ -0,0 +1,222 @@
+""" the sections of the Senior Team match report, each built from a MatchEvents"""
+from functools import partial
+
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+
+from pitch_plotly import plot_pitches, plot_segments, plot_markers
+from passmap import PassMap
+from passnet import networks, window_options, window_in_force
+from drilldown import EventIndex, player_fig, clicked_players
+from heatmaps import HeatmapGrids, DEFENSIVE_ACTIONS, smooth, heatmap_trace
+from helpers import get_goalkicks, get_shots, get_prog_passes, get_corners, get_ball_recoveries, get_aerials_data
+from event_store import load_match
+import figure_cache
+import instrument
+from shared_cache import memoize
+
+HOME_COLOR = 'dodgerblue'
+AWAY_COLOR = 'red'
+
+def recoveries_fig(md):
+    """ ball recoveries per player, home and away"""
+    home_team, away_team = md["home"]["name"], md["away"]["name"]
+    metrics = ["Ball Recoveries"]
+    plot_titles = [team + " " + metric for metric in metrics for team in [home_team, away_team]]
+    fig = make_subplots(rows=1, cols=2, subplot_titles=plot_titles)
+
+    fig.update_layout(width=800, height=500, autosize=True, showlegend=False)
+    fig.update_yaxes(scaleratio=0.8, showgrid=False, zeroline=False, showticklabels=False, row=1, col=1)
+    fig.update_xaxes(showgrid=False, zeroline=False, showticklabels=False, row=1, col=1)
+
+    fig.update_yaxes(scaleratio=0.8, showgrid=False, zeroline=False, showticklabels=False, row=1, col=2)
+    fig.update_xaxes(showgrid=False, zeroline=False, showticklabels=False, row=1, col=2)
+
+    h_recov = get_ball_recoveries(md, "home")
+    fig.add_trace(go.Bar(x=h_recov["recoveries"], y=h_recov["player_name"], orientation='h'), row=1, col=1)
+
+    a_recov = get_ball_recoveries(md, "away")
+    fig.add_trace(go.Bar(x=a_recov["recoveries"], y=a_recov["player_name"], orientation='h'), row=1, col=2)
+    return fig
+
+def aerials_table(md):
+    """ the aerial duels matrix"""
+    return get_aerials_data(md)
+
+def pitch_grid(md, metrics):
+    """ a len(metrics)x2 grid of pitches, home on the left and away on the right"""
+    home_team, away_team = md["home"]["name"], md["away"]["name"]
+    plot_titles = [team + " " + metric for metric in metrics for team in [home_team, away_team]]
+    fig = make_subplots(rows=len(metrics), cols=2, subplot_titles=plot_titles)
+    return plot_pitches(fig, [(r, c) for r in range(1, len(metrics) + 1) for c in (1, 2)], color="black")
+
+def style_grid(fig, n_rows):
+    fig.update_layout(width=800, height=600*n_rows, autosize=True, showlegend=False)
+    fig.update_yaxes(scaleratio=0.8, showgrid=False, zeroline=False, showticklabels=False)
+    fig.update_xaxes(showgrid=False, zeroline=False, showticklabels=False)
+    return fig
+
+def draw_shots(fig, md, row):
+    for side, col, color in [("home", 1, HOME_COLOR), ("away", 2, AWAY_COLOR)]:
+        shots = get_shots(md, side=side)
+        fig = plot_markers(fig, shots["x"], shots["y"], nr=row, nc=col, hovertext=shots["player_name"],
+                           marker={"color":color, 'symbol':'circle-open', 'size':10},
+                           hovertemplate="<b>%{hovertext}</b><extra></extra>")
+    return fig
+
+def draw_prog_passes(fig, md, row):
+    for side, col, color in [("home", 1, HOME_COLOR), ("away", 2, AWAY_COLOR)]:
+        prog = get_prog_passes(md, side=side)
+        fig = plot_segments(fig, prog.x, prog.y, prog.endX, prog.endY, nr=row, nc=col, color=color)
+        fig = plot_markers(fig, prog.x, prog.y, nr=row, nc=col, text=prog.player_name,
+                           marker={'symbol': 'circle', 'color': color}, hovertemplate="<b>%{text}</b><extra></extra>")
+    return fig
+
+def draw_goalkicks(fig, md, row):
+    for side, col, color in [("home", 1, HOME_COLOR), ("away", 2, AWAY_COLOR)]:
+        gks = get_goalkicks(md, side)
+        fig = plot_segments(fig, gks.x, gks.y, gks.endX, gks.endY, nr=row, nc=col, color=color)
+        fig = plot_markers(fig, gks.x, gks.y, nr=row, nc=col, text=gks.player_name,
+                           marker={'symbol': 'circle', 'color': color}, hovertemplate="<b>%{text}</b><extra></extra>")
+    return fig
+
+def draw_passmaps(fig, md, row):
+    fig = PassMap(fig=fig, match_dict=md, nr=row, nc=1, color=HOME_COLOR).plot_passmap()
+    return PassMap(fig=fig, match_dict=md, nr=row, nc=2, color=AWAY_COLOR, side="away").plot_passmap()
+
+##in possession rows: metric title -> drawer
+IN_POSSESSION = {"Shots": draw_shots,
+                 "Progressive Passes": draw_prog_passes,
+                 "Goalkicks": draw_goalkicks,
+                 "Passmap & Average Position": draw_passmaps}
+
+def in_possession_fig(md, metrics=None):
+    """ shots, progressive passes, goal-kicks and pass maps (or only the given metrics) on an nx2 pitch grid"""
+    metrics = list(IN_POSSESSION) if metrics is None else metrics
+    fig = pitch_grid(md, metrics)
+    for row, metric in enumerate(metrics, 1):
+        fig = IN_POSSESSION[metric](fig, md, row)
+    return style_grid(fig, len(metrics))
+
+def set_pieces_fig(md):
+    """ corners, home and away"""
+    home_team, away_team = md["home"]["name"], md["away"]["name"]
+    fig_3 = make_subplots(rows=1, cols=2, subplot_titles=(f"{home_team} Corners", f"{away_team} Corners"))
+
+    fig_3 = plot_pitches(fig_3, [(1, 1), (1, 2)], color="black")
+    home_corners = get_corners(md, "home")
+    away_corners = get_corners(md, "away")
+
+    fig_3 = plot_segments(fig_3, home_corners.x, home_corners.y, home_corners.endX, home_corners.endY, nr=1, nc=1, color=HOME_COLOR)
+    fig_3 = plot_markers(fig_3, home_corners.endX, home_corners.endY, nr=1, nc=1, text=home_corners.player_name,
+                         marker={'symbol': 'x', 'color': HOME_COLOR}, hovertemplate="<b>%{text}</b><extra></extra>")
+
+    fig_3 = plot_segments(fig_3, away_corners.x, away_corners.y, away_corners.endX, away_corners.endY, nr=1, nc=2, color=AWAY_COLOR)
+    fig_3 = plot_markers(fig_3, away_corners.endX, away_corners.endY, nr=1, nc=2, text=away_corners.player_name,
+                         marker={'symbol': 'x', 'color': AWAY_COLOR}, hovertemplate="<b>%{text}</b><extra></extra>")
+    fig_3.update_layout(showlegend=False, width=800, height=500)
+    fig_3.update_yaxes(scaleratio=0.8, showgrid=False, zeroline=False, showticklabels=False)
+    fig_3.update_xaxes(showgrid=False, zeroline=False, showticklabels=False)
+    return fig_3
+
+def heatmaps_fig(md, types=DEFENSIVE_ACTIONS, players=None, periods=None, sigma=1.0, grids=None):
+    """ home and away heatmaps of the given event types (defensive actions by default) on one colour scale"""
+    grids = HeatmapGrids.from_match(md) if grids is None else grids
+    title = "Defensive Actions" if list(types) == DEFENSIVE_ACTIONS else ", ".join(types)
+    fig = pitch_grid(md, [title])
+    totals = [smooth(grids.total(side, players, types, periods), sigma) for side in ["home", "away"]]
+    zmax = max(total.max() for total in totals) or 1
+    for col, total in enumerate(totals, 1):
+        fig.add_trace(heatmap_trace(total, zmax=zmax), row=1, col=col)
+    fig.update_shapes(layer="above") ##pitch markings over the cells
+    return style_grid(fig, 1)
+
+##section name -> builder, in page order. each in possession row is its own section
+##so it can be built and shown without the other three
+SECTIONS = {"heatmaps": heatmaps_fig,
+            "recoveries": recoveries_fig,
+            "aerials": aerials_table,
+            "shots": partial(in_possession_fig, metrics=["Shots"]),
+            "prog_passes": partial(in_possession_fig, metrics=["Progressive Passes"]),
+            "goalkicks": partial(in_possession_fig, metrics=["Goalkicks"]),
+            "passmaps": partial(in_possession_fig, metrics=["Passmap & Average Position"]),
+            "set_pieces": set_pieces_fig}
+
+@memoize
+def _load(match_file, digest):
+    return load_match(match_file)
+
+@memoize
+def _section(match_file, digest, name):
+    return figure_cache.get_or_build(match_file, name, lambda: SECTIONS[name](_load(match_file, digest)))
+
+def section(match_file, name):
+    """ one built section of a match, memoized in memory per match content (shared by
+        every session), then on disk; the match is parsed only if a requested section is
+        in neither cache
+    """
+    with instrument.span(f"report.section.{name}") as fields:
+        obj, outcome = _section.lookup(match_file, figure_cache.file_hash(match_file), name)
+        fields["cache"] = {"hit": "memory", "wait": "memory (waited)"}.get(outcome, "miss")
+    return obj
+
+@memoize
+def _networks(match_file, digest):
+    me = _load(match_file, digest)
+    return {side: networks(me, side) for side in ["home", "away"]}
+
+def passmap_windows(match_file, scheme):
+    """ window labels of a scheme for either team, in match order"""
+    return window_options(_networks(match_file, figure_cache.file_hash(match_file)).values(), scheme)
+
+@memoize
+def _passmap_window_fig(match_file, digest, scheme, window):
+    me = _load(match_file, digest)
+    nets = _networks(match_file, digest)
+    fig = pitch_grid(me, [f"Passmap ({window})"])
+    for side, col, color in [("home", 1, HOME_COLOR), ("away", 2, AWAY_COLOR)]:
+        fig = PassMap(fig=fig, match_dict=me, nr=1, nc=col, color=color, side=side, scheme=scheme,
+                      window=window_in_force(nets[side], scheme, window), network=nets[side]).plot_passmap()
+    return style_grid(fig, 1)
+
+def passmap_window_fig(match_file, scheme, window):
+    """ home and away pass maps of one time window; the networks of every window are built
+        together once per match, so moving between windows only draws
+    """
+    return _passmap_window_fig(match_file, figure_cache.file_hash(match_file), scheme, window)
+
+@memoize
+def _heatmap_grids(match_file, digest):
+    return HeatmapGrids.from_match(_load(match_file, digest))
+
+@memoize
+def _heatmap_fig(match_file, digest, types, players, periods, sigma):
+    return heatmaps_fig(_load(match_file, digest), types=list(types), players=list(players) or None,
+                        periods=list(periods) or None, sigma=sigma, grids=_heatmap_grids(match_file, digest))
+
+def heatmap_fig(match_file, types=DEFENSIVE_ACTIONS, players=(), periods=(), sigma=1.0):
+    """ heatmaps of any (event types, players, periods) filter; the grids are binned once
+        per match, so a new filter only sums and draws them
+    """
+    return _heatmap_fig(match_file, figure_cache.file_hash(match_file), tuple(types), tuple(players or ()),
+                        tuple(periods or ()), sigma)
+
+def heatmap_filters(match_file):
+    """ (event types, {side: players}) present in a match"""
+    grids = _heatmap_grids(match_file, figure_cache.file_hash(match_file))
+    return grids.types(), {side: grids.players(side) for side in ["home", "away"]}
+
+@memoize
+def _event_index(match_file, digest):
+    return EventIndex(_load(match_file, digest))
+
+def drilldown(match_file, fig, points):
+    """ (players, figure of their shots, progressive passes, goal kicks and corners) for the
+        points clicked or box/lasso selected on fig, ([], None) if none is a player; the rows
+        of every player are indexed once per match, so a click only selects and draws them
+    """
+    with instrument.span("report.drilldown") as fields:
+        index = _event_index(match_file, figure_cache.file_hash(match_file))
+        players = clicked_players(fig, points, index.sides)
+        fields["players"] = len(players)
+        return (players, player_fig(index, players)) if players else ([], None)
@@ -0,0 +1,120 @@
+""" season aggregation over every match file
+
+    the per-match extractors run in a process pool, each match's partial frames are
+    cached on disk (keyed like the figure cache by file hash and code version) so a
+    new or changed match is the only one recomputed, and the partials are merged
+    into season frames filterable by team, opponent and home/away
+
+    python season.py    build the season frames and print a summary
+"""
+import glob
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from helpers import get_shots, get_prog_passes
+from xt import score_events
+from duels import duel_pairs, DUELS
+from passnet import pass_receivers
+from event_store import load_match, MATCH_DIR
+from figure_cache import file_hash, code_version
+
+CACHE_DIR = os.environ.get("SEASON_CACHE_DIR", ".season_cache")
+FRAMES = ["shots", "prog_passes", "recoveries", "xt", "pass_links", "duels", "chains"]
+
+def match_name(match_file):
+    return os.path.splitext(os.path.basename(match_file))[0]
+
+def pass_links(me, side="home"):
+    """ completed open-play passes between teammates, receivers as in passnet"""
+    links = pass_receivers(me, side)
+    return (links.groupby(["playerId", "player_name", "receiver_id", "receiver_name"])
+                 .agg(count=("x", "size"), x=("x", "mean"), y=("y", "mean")).reset_index())
+
+def extract(match_file):
+    """ partial season frames of one match, both teams, tagged with match/team/venue/opponent"""
+    me = load_match(match_file)
+    scored = score_events(me)
+    _, chains = me.chains
+    parts = {name: [] for name in FRAMES}
+    for side, other in [("home", "away"), ("away", "home")]:
+        tags = {"match": match_name(match_file), "team": me[side]["name"], "venue": side, "opponent": me[other]["name"]}
+        parts["shots"].append(get_shots(me, side).assign(**tags))
+        parts["prog_passes"].append(get_prog_passes(me, side).assign(**tags))
+        recoveries = me.team_df(side).query("type_displayName == 'BallRecovery'")
+        parts["recoveries"].append(recoveries[["player_name", "minute", "x", "y"]].assign(**tags))
+        parts["xt"].append(scored[scored["teamId"] == me.team_ids[side]].assign(**tags))
+        parts["pass_links"].append(pass_links(me, side).assign(**tags))
+        parts["duels"].extend(duel_pairs(me, duel, side=side).assign(**tags) for duel in DUELS)
+        parts["chains"].append(chains[chains["side"] == side].reset_index().assign(**tags))
+    return {name: pd.concat(frames, ignore_index=True) for name, frames in parts.items()}
+
+def cache_path(match_file):
+    version = code_version(("season", "possession"))
+    return os.path.join(CACHE_DIR, f"{match_name(match_file)}-{file_hash(match_file)[:16]}-{version}.pkl")
+
+def load_partials(match_files, processes=None):
+    """ {match_file: partial frames}, extracting only matches without a cached result"""
+    partials, missing = {}, []
+    for mf in match_files:
+        try:
+            with open(cache_path(mf), "rb") as f:
+                partials[mf] = pickle.load(f)
+        except FileNotFoundError:
+            missing.append(mf)
+
+    if len(missing) > 1 and processes != 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = dict(zip(missing, pool.map(extract, missing)))
+    else:
+        results = {mf: extract(mf) for mf in missing}
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for mf, parts in results.items():
+        for old in glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(match_name(mf))}-*.pkl")):
+            os.remove(old)
+        with open(cache_path(mf), "wb") as f:
+            pickle.dump(parts, f)
+        partials[mf] = parts
+    return partials
+
+def season_frames(match_files=None, team=None, opponent=None, venue=None, processes=None):
+    """ season-level frames (shots, prog_passes, recoveries, xt, pass_links, duels, chains),
+        optionally filtered to one team, opponent(s) and "home"/"away"
+    """
+    match_files = sorted(glob.glob(os.path.join(MATCH_DIR, "*.json"))) if match_files is None else match_files
+    partials = load_partials(match_files, processes=processes)
+    frames = {}
+    for name in FRAMES:
+        df = pd.concat([partials[mf][name] for mf in match_files], ignore_index=True)
+        if team is not None:
+            df = df[df["team"] == team]
+        if opponent is not None:
+            df = df[df["opponent"].isin(np.atleast_1d(opponent))]
+        if venue is not None:
+            df = df[df["venue"] == venue]
+        frames[name] = df.reset_index(drop=True)
+    return frames
+
+def season_network(pass_links_df, min_count=1):
+    """ season pass network: link counts summed, player positions weighted by passes made"""
+    links = (pass_links_df.groupby(["player_name", "receiver_name"])
+                          .agg(count=("count", "sum")).reset_index())
+    weighted = pass_links_df.assign(wx=pass_links_df["x"]*pass_links_df["count"], wy=pass_links_df["y"]*pass_links_df["count"])
+    nodes = weighted.groupby("player_name").agg(wx=("wx", "sum"), wy=("wy", "sum"), num=("count", "sum")).reset_index()
+    nodes["x"], nodes["y"] = nodes["wx"]/nodes["num"], nodes["wy"]/nodes["num"]
+    return links[links["count"] >= min_count].reset_index(drop=True), nodes[["player_name", "x", "y", "num"]]
+
+if __name__ == "__main__":
+    for label in ["first call", "second call (cached partials)"]:
+        t = time.perf_counter()
+        frames = season_frames(team="Villarreal")
+        print(f"{label}: {(time.perf_counter() - t)*1000:.0f} ms")
+
+    print(frames["shots"].groupby("venue").size().to_string())
+    print(frames["xt"].groupby("player_name")["xt"].sum().sort_values(ascending=False).head(5).to_string())
+    print(frames["recoveries"]["player_name"].value_counts().head(5).to_string())
@@ -0,0 +1,171 @@
+""" process-wide in-memory cache shared by every streamlit session
+
+    parsed matches, derived frames and built figures are kept once per process, not
+    once per session, under a byte budget (SHARED_CACHE_MB, default 256): each entry's
+    size is measured when it is stored and the least recently used entries are evicted
+    until the cache fits. loading is single-flight: when several sessions ask for the
+    same missing key at once, one of them loads it and the others wait for its result.
+    hits, misses, waits and evictions are counted for the debug sidebar
+
+    @memoize replaces functools.lru_cache on the loaders (report, workbooks, images, ...)
+
+    python shared_cache.py    concurrent sessions on one match: parses and peak entries
+"""
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MAX_BYTES = int(float(os.environ.get("SHARED_CACHE_MB", "256")) * 1024 * 1024)
+
+def object_size(obj, seen=None):
+    """ approximate bytes held by obj: dataframes and arrays by their buffers, containers
+        and plain objects (MatchEvents, QualifierIndex, ...) by walking what they hold;
+        anything reachable twice is counted once
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = obj.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.dtype != object else obj.nbytes + sum(object_size(v, seen) for v in obj.ravel())
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(object_size(k, seen) + object_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(object_size(v, seen) for v in obj)
+    if hasattr(obj, "to_plotly_json"):  ##plotly figure objects
+        return object_size(obj.to_plotly_json(), seen)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + object_size(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+class _Flight():
+    """ one load in progress, awaited by the concurrent requests for the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SharedCache():
+    """ byte-bounded LRU of loaded values with single-flight loading"""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  ##key -> (value, size), least recently used first
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "waits": 0, "evictions": 0}
+
+    def get_or_load(self, key, load):
+        """ (value, outcome): outcome is "hit", "miss" (this call loaded it) or "wait"
+            (another request was loading it and this one got its result)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return self._entries[key][0], "hit"
+            flight = self._loading.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._loading[key] = _Flight()
+            self.counters["misses" if owner else "waits"] += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "wait"
+
+        try:
+            value = load()
+            size = object_size(value)
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            with self._lock:
+                self._store(key, value, size)
+            return value, "miss"
+        finally:
+            with self._lock:
+                del self._loading[key]
+            flight.done.set()
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return  ##larger than the whole budget: served, not kept
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.counters["evictions"] += 1
+
+    def clear(self, prefix=None):
+        """ drop every entry, or those whose key starts with prefix"""
+        with self._lock:
+            for key in [k for k in self._entries if prefix is None or k[:len(prefix)] == prefix]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), mb=self.bytes / 2**20,
+                        max_mb=self.max_bytes / 2**20)
+
+CACHE = SharedCache()
+
+def memoize(fn=None, cache=None):
+    """ decorator caching fn's results in the shared cache, keyed by its arguments
+        (which must be hashable, as with lru_cache); fn.lookup(...) also returns the outcome
+    """
+    def wrap(fn):
+        prefix = (fn.__module__, fn.__qualname__)
+
+        def lookup(*args, **kwargs):
+            key = prefix + (args, tuple(sorted(kwargs.items())))
+            return (cache or CACHE).get_or_load(key, lambda: fn(*args, **kwargs))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return lookup(*args, **kwargs)[0]
+        wrapper.lookup = lookup
+        wrapper.cache_clear = lambda: (cache or CACHE).clear(prefix)
+        return wrapper
+    return wrap(fn) if fn is not None else wrap
+
+if __name__ == "__main__":
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import event_store
+    import report
+    import shared_cache ##the module report uses, not this __main__ copy
+    from figure_cache import file_hash
+
+    match_file = "static/first_team/1492277_Villarreal_Cadiz.json"
+    parses = []
+    original = event_store.load_match
+    report.load_match = lambda mf: parses.append(mf) or original(mf)
+
+    ##eight sessions open the same match at once, then each opens every section
+    t = time.perf_counter()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: report._load(match_file, file_hash(match_file)), range(8)))
+        list(pool.map(lambda name: report.section(match_file, name), list(report.SECTIONS) * 8))
+    print(f"8 sessions: {len(parses)} parse(s) in {time.perf_counter() - t:.2f} s  {shared_cache.CACHE.stats()}")
+
+    small = SharedCache(max_bytes=2 * object_size(report._load(match_file, file_hash(match_file))))
+    for mf in sorted(event_store.glob.glob(f"{event_store.MATCH_DIR}/*.json")):
+        small.get_or_load(mf, lambda: original(mf))
+    print(f"budget of two matches, seven loaded: {small.stats()}")
@@ -0,0 +1,153 @@
+""" "players like X" search over static/top_five_leagues_data.csv
+
+    counting stats are turned into per 90 values, every feature is z-scored within the
+    player's position group (GK, DF, MF, FW: the first position listed) and the result
+    is kept as one contiguous float32 matrix, rows sorted by group so each group is a
+    slice. a query is one matrix-vector product over the group plus an argpartition for
+    the top k, so it stays in milliseconds with tens of thousands of players
+
+    python similarity.py "Gerard Moreno"    neighbours of a player, and query timings
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+import figure_cache
+from instrument import timed
+from shared_cache import memoize
+
+DATA_FILE = "static/top_five_leagues_data.csv"
+INFO_COLUMNS = ["player", "nation_x", "pos_x", "squad_x", "comp_x", "age_x"]
+META_COLUMNS = ["age_x", "born_x", "playing time_mp", "playing time_starts", "playing time_min",
+                "playing time_90s", "90s_x", "90s"]
+##columns that already are rates (per 90, percentages, per shot, average distance); the rest are counts
+RATE_PATTERN = re.compile(r"per 90|/90|90$|%|/sh|/sot|_dist$")
+METRICS = ["cosine", "euclidean"]
+
+class SimilarityIndex():
+    """ position-normalized player feature matrix with top-k nearest neighbour queries"""
+
+    def __init__(self, info, features):
+        """ info: one row per player (player, squad_x, ..., group); features: numeric
+            per 90 / rate columns in the same row order
+        """
+        order = np.argsort(info["group"].values, kind="stable")
+        self.info = info.iloc[order].reset_index(drop=True)
+        features = features.iloc[order].reset_index(drop=True)
+        self.columns = list(features.columns)
+
+        grouped = features.groupby(self.info["group"].values)
+        std = grouped.transform("std").replace(0, 1).fillna(1)
+        z = ((features - grouped.transform("mean")) / std).fillna(0)
+        self.matrix = np.ascontiguousarray(z.values, dtype=np.float32)
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.unit = self.matrix / np.where(norms == 0, 1, norms)
+        self.sq_norms = norms[:, 0] ** 2
+
+        groups = self.info["group"].values
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        ends = np.r_[starts[1:], len(groups)]
+        self.groups = {groups[s]: slice(s, e) for s, e in zip(starts, ends)}
+        self.rows = {name: i for i, name in enumerate(self.info["player"])}
+
+    @classmethod
+    def from_frame(cls, df, min_minutes=450):
+        """ index of the players with at least min_minutes played"""
+        df = df[df["playing time_min"] >= min_minutes].reset_index(drop=True)
+        numeric = df.select_dtypes("number").drop(columns=[c for c in META_COLUMNS if c in df])
+        counts = [c for c in numeric.columns if not RATE_PATTERN.search(c)]
+        numeric[counts] = numeric[counts].div(df["playing time_90s"].replace(0, np.nan), axis=0)
+
+        info = df[[c for c in INFO_COLUMNS if c in df]].copy()
+        info["group"] = df["pos_x"].fillna("").str.split(",").str[0]
+        info["minutes"] = df["playing time_min"]
+        return cls(info, numeric)
+
+    def weight_vector(self, weights=None):
+        """ per-column weights from a {column: weight} dict, 1 for the others"""
+        w = np.ones(len(self.columns), dtype=np.float32)
+        for col, value in (weights or {}).items():
+            w[self.columns.index(col)] = value
+        return w
+
+    def query(self, player, k=10, metric="cosine", weights=None, same_group=True):
+        """ the k players most similar to `player` (by name), most similar first
+
+            metric "cosine" scores by the cosine of the normalized feature vectors (higher is
+            closer), "euclidean" by the weighted euclidean distance (lower is closer);
+            weights ({column: weight}) apply to both
+        """
+        i = self.rows[player]
+        rows = self.groups[self.info["group"].iat[i]] if same_group else slice(0, len(self.matrix))
+        w = self.weight_vector(weights)
+
+        if metric == "cosine":
+            if weights:
+                x = self.matrix[rows] * np.sqrt(w)
+                q = self.matrix[i] * np.sqrt(w)
+                scores = (x @ q) / (np.linalg.norm(x, axis=1) * np.linalg.norm(q) + 1e-12)
+            else:
+                scores = self.unit[rows] @ self.unit[i]
+            order = -scores
+        elif metric == "euclidean":
+            if weights:
+                diff = self.matrix[rows] - self.matrix[i]
+                scores = np.sqrt(np.square(diff) @ w)
+            else: ##|x - q|^2 = |x|^2 + |q|^2 - 2 x.q, no n x d temporary
+                sq = self.sq_norms[rows] + self.sq_norms[i] - 2 * (self.matrix[rows] @ self.matrix[i])
+                scores = np.sqrt(np.maximum(sq, 0))
+            order = scores
+        else:
+            raise ValueError(f"metric must be one of {METRICS}")
+
+        order[i - rows.start] = np.inf  ##not the player themselves
+        k = min(k, len(order) - 1)
+        top = np.argpartition(order, k)[:k] if k < len(order) else np.arange(len(order))
+        top = top[np.argsort(order[top])]
+
+        result = self.info.iloc[top + rows.start].reset_index(drop=True)
+        result[metric] = scores[top]
+        return result
+
+@memoize
+def _index(path, digest, min_minutes):
+    return SimilarityIndex.from_frame(pd.read_csv(path), min_minutes=min_minutes)
+
+@timed
+def load_index(path=DATA_FILE, min_minutes=450):
+    """ the index of a csv, built once per process and again only if the file changes"""
+    return _index(path, figure_cache.file_hash(path), min_minutes)
+
+def squad_players(index, squad="Villarreal"):
+    """ names of a squad's players in the index"""
+    return sorted(index.info.loc[index.info["squad_x"] == squad, "player"])
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    t = time.perf_counter()
+    index = load_index()
+    print(f"index of {index.matrix.shape[0]} players x {index.matrix.shape[1]} features in {(time.perf_counter() - t)*1000:.0f} ms\n")
+
+    player = sys.argv[1] if len(sys.argv) > 1 else "Gerard Moreno"
+    for metric in METRICS:
+        print(index.query(player, k=8, metric=metric)[["player", "squad_x", "comp_x", "pos_x", metric]].to_string(index=False), "\n")
+
+    ##the same data grown to ~80k players (~58k over the minutes cut): every row 30 times with noise
+    df = pd.read_csv(DATA_FILE)
+    rng = np.random.default_rng(0)
+    big = pd.concat([df.assign(player=df["player"] + f" #{i}") for i in range(30)], ignore_index=True)
+    numeric = big.select_dtypes("number").columns.drop(META_COLUMNS, errors="ignore")
+    big[numeric] = big[numeric] * rng.normal(1, 0.05, size=(len(big), len(numeric)))
+    t = time.perf_counter()
+    big_index = SimilarityIndex.from_frame(big)
+    built = time.perf_counter() - t
+    for name, idx, who in [("real", index, player), ("x30", big_index, player + " #0")]:
+        for metric in METRICS:
+            t = time.perf_counter()
+            for _ in range(50):
+                idx.query(who, k=10, metric=metric)
+            print(f"{name:4} {len(idx.matrix):6} players {metric:9} {(time.perf_counter() - t)/50*1000:6.2f} ms/query")
+    print(f"x30 index built in {built*1000:.0f} ms")
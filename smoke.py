@@ -0,0 +1,69 @@
+""" smoke check of the Senior Team page: runs app.py headless, ticks every box and drives
+    the match select, the pass map time windows and the heatmap periods, and exits 1 if
+    any run raised
+
+    it needs streamlit's AppTest (streamlit 1.28 or later), which the pinned streamlit
+    0.81.1 of requirements.txt does not have, so it runs in its own environment with newer
+    streamlit, pandas and numpy than the deployed app: it catches errors in the app's
+    logic, not ones specific to the pinned versions
+
+    python -m venv .venv-smoke && .venv-smoke/bin/pip install -r requirements-smoke.txt
+    .venv-smoke/bin/python smoke.py
+"""
+import os
+import sys
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+def errors(at, label):
+    """ the exceptions of the last run, tagged with what was driven"""
+    return [f"{label}: {e.value}" for e in at.exception]
+
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+def run(timeout=180):
+    from streamlit.testing.v1 import AppTest
+    from passnet import SCHEMES
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.run()
+    failed = errors(at, "first run")
+    for box in at.checkbox:
+        box.check()
+    at.run()
+    failed += errors(at, "every box ticked")
+
+    matches = widget(at.selectbox, "Select match to explore")
+    for match in matches.options:
+        widget(at.selectbox, "Select match to explore").select(match)
+        at.run()
+        failed += errors(at, match)
+        for scheme in SCHEMES:  ##the radio's raw values, its options are the formatted labels
+            widget(at.radio, "Time window").set_value(scheme)
+            at.run()
+            failed += errors(at, f"{match} / pass map {scheme}")
+            windows = [w for w in at.select_slider if w.label == "Window"]
+            for window in windows[0].options[1:] if windows else []:
+                widget(at.select_slider, "Window").set_value(window)
+                at.run()
+                failed += errors(at, f"{match} / pass map {scheme} {window}")
+        widget(at.radio, "Time window").set_value(SCHEMES[0])
+        for period in widget(at.radio, "Period").options:
+            widget(at.radio, "Period").set_value(period)
+            at.run()
+            failed += errors(at, f"{match} / heatmaps {period}")
+        widget(at.radio, "Period").set_value(widget(at.radio, "Period").options[0])
+    return failed
+
+if __name__ == "__main__":
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except ImportError:
+        sys.exit("smoke.py needs streamlit's AppTest (streamlit>=1.28): pip install -r requirements-smoke.txt "
+                 "in a separate virtualenv, requirements.txt pins streamlit 0.81.1")
+
+    os.chdir(os.path.dirname(APP))
+    failed = run()
+    print("\n".join(failed) or "no exceptions")
+    sys.exit(1 if failed else 0)
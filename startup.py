@@ -0,0 +1,127 @@
+""" cold-start profiling of the dashboard
+
+    with STARTUP_PROFILE=<file.json> set, app.py times every module import (inclusive
+    of what it imports in turn) and marks when each part of the first page is drawn,
+    and writes both to that file at the end of its first run. without it mark() and
+    write() do nothing
+
+    python startup.py               cold-start benchmark: launch app.py in fresh processes
+    python startup.py --runs 5      (bare mode: the first page run without a browser)
+    python startup.py --server      also time `streamlit run` until the server answers
+    python startup.py --empty-cache ... with empty figure/workbook caches
+"""
+import builtins
+import json
+import os
+import sys
+import time
+
+PROFILE_FILE = os.environ.get("STARTUP_PROFILE")
+T0 = float(os.environ.get("STARTUP_T0", time.time()))  ##launch time, when set by the benchmark
+
+IMPORTS = []  ##(module, nesting depth, seconds) in the order the imports finished
+MARKS = []    ##(label, seconds since T0)
+
+_depth = 0
+_written = False
+
+def profile_imports():
+    """ time every import that loads a new module from now on, if profiling"""
+    if not PROFILE_FILE or getattr(builtins.__import__, "profiled", False):
+        return
+    original = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        global _depth
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        t = time.perf_counter()
+        _depth += 1
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            _depth -= 1
+            IMPORTS.append((name, _depth, time.perf_counter() - t))
+
+    timed_import.profiled = True
+    builtins.__import__ = timed_import
+
+def mark(label):
+    """ record that `label` is done, in seconds since launch"""
+    if PROFILE_FILE and not _written:
+        MARKS.append((label, time.time() - T0))
+
+def write():
+    """ dump the timings to STARTUP_PROFILE, once per process"""
+    global _written
+    if not PROFILE_FILE or _written:
+        return
+    _written = True
+    with open(PROFILE_FILE, "w") as f:
+        json.dump({"imports": IMPORTS, "marks": MARKS}, f, indent=1)
+
+def run_bare(env):
+    """ seconds from launch to exit of one bare `python app.py`, and its profile"""
+    import subprocess
+    profile_file = os.path.join(env["STARTUP_TMP"], f"profile-{time.time_ns()}.json")
+    env = dict(env, STARTUP_PROFILE=profile_file, STARTUP_T0=repr(time.time()))
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "app.py"], env=env, check=True, capture_output=True)
+    total = time.perf_counter() - t
+    with open(profile_file) as f:
+        return total, json.load(f)
+
+def run_server(env, port=8599, timeout=120):
+    """ seconds from `streamlit run` until its health endpoint answers"""
+    import subprocess
+    import urllib.request
+    t = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "streamlit", "run", "app.py", "--server.headless", "true",
+                             "--server.port", str(port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t < timeout:
+            for path in ["/healthz", "/_stcore/health"]:  ##streamlit 0.81, newer releases
+                try:
+                    with urllib.request.urlopen(f"http://localhost:{port}{path}", timeout=1) as r:
+                        if r.status == 200:
+                            return time.perf_counter() - t
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        raise TimeoutError("streamlit did not answer")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+    import tempfile
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--server", action="store_true")
+    parser.add_argument("--empty-cache", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, STARTUP_TMP=tmp)
+        results = []
+        for i in range(args.runs):
+            if args.empty_cache:
+                env.update(FIGURE_CACHE_DIR=os.path.join(tmp, f"figures{i}"), WORKBOOK_CACHE_DIR=os.path.join(tmp, f"workbooks{i}"))
+            results.append(run_bare(env))
+
+        totals = [total for total, _ in results]
+        print(f"launch to first page run: median {statistics.median(totals):.2f} s  (runs: {', '.join(f'{t:.2f}' for t in totals)})")
+        _, profile = results[-1]
+        print("\nmarks (s since launch, last run)")
+        for label, at in profile["marks"]:
+            print(f"  {label:35} {at:6.2f}")
+        print("\nslowest top-level imports (s, inclusive, last run)")
+        top = sorted((s, name) for name, depth, s in profile["imports"] if depth == 0)[::-1][:12]
+        for s, name in top:
+            print(f"  {name:35} {s:6.3f}")
+
+        if args.server:
+            print(f"\nstreamlit run until the server answers: {run_server(env):.2f} s")
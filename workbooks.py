@@ -0,0 +1,77 @@
+""" xlsx inputs parsed once and kept as pickled dataframes
+
+    openpyxl parsing dominates the B/C pages, so each workbook is read once, cleaned
+    once and stored under .workbook_cache/ keyed by its content hash (the hash itself
+    is only recomputed when the file's mtime or size changes). later loads are a
+    pickle read, and repeated loads in one process come from memory
+
+    python workbooks.py    convert every workbook under static/
+"""
+import glob
+import os
+import pickle
+import sys
+
+import pandas as pd
+
+from figure_cache import file_hash
+from instrument import timed
+from shared_cache import memoize
+
+CACHE_DIR = os.environ.get("WORKBOOK_CACHE_DIR", ".workbook_cache")
+
+##every workbook the dashboard uses or will use: B/C player stats and GPS, U-19,
+##women's team and the first team J*.xlsx GPS files
+WORKBOOK_GLOBS = ["static/bc_teams/*.xlsx", "static/women_team/*.xlsx", "static/first_team/J*.xlsx"]
+
+def read_workbook(path, all_sheets=False, clean=False):
+    """ parse a workbook with pandas; all_sheets stacks every sheet like get_b_figs did,
+        clean replaces "-" with 0 and fills the gaps with 0
+    """
+    if all_sheets:
+        df = pd.concat(pd.read_excel(path, sheet_name=None, index_col=None).values())
+    else:
+        df = pd.read_excel(path)
+    if clean:
+        df = df.replace("-", 0).fillna(0)
+    return df
+
+def cache_path(path, all_sheets, clean, digest):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{int(all_sheets)}{int(clean)}-{digest[:16]}.pkl")
+
+@memoize
+def _load(path, all_sheets, clean, digest):
+    cached = cache_path(path, all_sheets, clean, digest)
+    try:
+        with open(cached, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+
+    df = read_workbook(path, all_sheets=all_sheets, clean=clean)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for old in glob.glob(cache_path(glob.escape(path), all_sheets, clean, "*")):
+        os.remove(old)
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cached)
+    return df
+
+@timed
+def load_workbook(path, all_sheets=False, clean=False):
+    """ the parsed (and optionally cleaned) workbook, from memory, the pickle cache or the xlsx.
+        callers get a copy, so they can modify it freely
+    """
+    return _load(path, all_sheets, clean, file_hash(path)).copy()
+
+def workbook_files():
+    return sorted(f for pattern in WORKBOOK_GLOBS for f in glob.glob(pattern))
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or workbook_files():
+        df = load_workbook(path)
+        if "players" in os.path.basename(path):  ##player stats are also read stacked and cleaned
+            df = load_workbook(path, all_sheets=True, clean=True)
+        print(f"{path:60} {df.shape}")
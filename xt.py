@@ -0,0 +1,112 @@
+""" expected threat (xT) engine using Karun Singh's 12x8 grid
+
+    the grid is loaded once, start and end points of every action are binned with
+    array operations, and any number of matches are scored in one call
+
+    python xt.py    season leaderboard over every match in static/first_team
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from qualifiers import SET_PIECE_QUALIFIERS
+
+XT_FILE = "static/expected_threat.json"
+ACTION_COLUMNS = ["playerId", "player_name", "teamId", "period_value", "minute", "second", "x", "y", "endX", "endY"]
+
+@lru_cache(maxsize=None)
+def load_grid(path=XT_FILE):
+    """ xT grid as an (n_rows, n_cols) array, rows along y and columns along x"""
+    with open(path) as f:
+        return np.array(json.load(f))
+
+def bin_index(values, n_bins):
+    """ 0-100 pitch coordinates to grid bins, values on the far line go in the last bin"""
+    return np.clip((np.asarray(values, dtype=float) * n_bins / 100).astype(int), 0, n_bins - 1)
+
+def open_play_passes(me):
+    """ successful passes that are not corners, free-kicks or throws"""
+    df = me.df
+    mask = ((df["type_displayName"] == "Pass") & (df["outcomeType_displayName"] == "Successful")).values
+    mask &= ~me.q.has(*SET_PIECE_QUALIFIERS)
+    return df.loc[mask, ACTION_COLUMNS].assign(action="pass")
+
+def carries(me, min_length=5, max_seconds=10):
+    """ carries inferred between a completed pass and the receiver's next touch:
+        same team, same period, at most max_seconds later and moved at least min_length units
+    """
+    df = me.df
+    completed = ((df["type_displayName"] == "Pass") & (df["outcomeType_displayName"] == "Successful")).values
+    team, period = df["teamId"].values, df["period_value"].values
+    seconds = (df["minute"]*60 + df["second"].fillna(0)).values
+    x, y, end_x, end_y = (df[col].values.astype(float) for col in ["x", "y", "endX", "endY"])
+    length = np.sqrt(np.square(x[1:] - end_x[:-1]) + np.square(y[1:] - end_y[:-1]))
+
+    mask = np.zeros(len(df), dtype=bool)
+    mask[1:] = (completed[:-1] & (team[1:] == team[:-1]) & (period[1:] == period[:-1]) &
+                df["isTouch"].values[1:].astype(bool) & df["playerId"].notnull().values[1:] &
+                (seconds[1:] - seconds[:-1] <= max_seconds) & (length >= min_length))
+
+    carry_df = df.loc[mask, ACTION_COLUMNS].copy()
+    carry_df["endX"], carry_df["endY"] = x[mask], y[mask]
+    prev = np.flatnonzero(mask) - 1
+    carry_df["x"], carry_df["y"] = end_x[prev], end_y[prev]
+    return carry_df.assign(action="carry")
+
+def score_actions(actions, grid=None):
+    """ add start/end bins, zone values and the xT added by each action"""
+    grid = load_grid() if grid is None else grid
+    n_rows, n_cols = grid.shape
+    actions = actions[actions["endX"].notnull()].reset_index(drop=True)
+
+    actions["x1_bin"], actions["y1_bin"] = bin_index(actions["x"], n_cols), bin_index(actions["y"], n_rows)
+    actions["x2_bin"], actions["y2_bin"] = bin_index(actions["endX"], n_cols), bin_index(actions["endY"], n_rows)
+    actions["start_zone_value"] = grid[actions["y1_bin"].values, actions["x1_bin"].values]
+    actions["end_zone_value"] = grid[actions["y2_bin"].values, actions["x2_bin"].values]
+    actions["xt"] = actions["end_zone_value"] - actions["start_zone_value"]
+    return actions
+
+def score_events(matches, include_carries=False):
+    """ xT of every open-play pass (and optionally carry) for any number of matches
+
+        matches: a MatchEvents, a list of them or a {label: MatchEvents} dict;
+        the label (list position for lists) ends up in the match column
+    """
+    if hasattr(matches, "df"):
+        matches = [matches]
+    items = matches.items() if isinstance(matches, dict) else enumerate(matches)
+
+    frames = []
+    for label, me in items:
+        frames.append(open_play_passes(me).assign(match=label))
+        if include_carries:
+            frames.append(carries(me).assign(match=label))
+    return score_actions(pd.concat(frames, ignore_index=True))
+
+def xt_tables(matches, include_carries=False):
+    """ per-event, per-player and per-zone xT totals as a dict of dataframes"""
+    events = score_events(matches, include_carries=include_carries)
+    players = (events.groupby(["teamId", "player_name"])
+                     .agg(xt=("xt", "sum"), actions=("xt", "size"), matches=("match", "nunique"))
+                     .reset_index().sort_values(by="xt", ascending=False, ignore_index=True))
+    zones = (events.groupby(["teamId", "x1_bin", "y1_bin"])
+                   .agg(xt=("xt", "sum"), actions=("xt", "size")).reset_index())
+    return {"events": events, "players": players, "zones": zones}
+
+if __name__ == "__main__":
+    import glob
+    import time
+    from event_store import load_match
+
+    t = time.perf_counter()
+    matches = {mf: load_match(mf) for mf in sorted(glob.glob("static/first_team/*.json"))}
+    loaded = time.perf_counter()
+    tables = xt_tables(matches, include_carries=True)
+    done = time.perf_counter()
+
+    team_id = next(me[side]["teamId"] for me in matches.values() for side in ["home", "away"] if me[side]["name"] == "Villarreal")
+    print(tables["players"].query("teamId == @team_id").head(15).to_string(index=False))
+    print(f"\n{len(tables['events'])} actions in {len(matches)} matches, "
+          f"load {(loaded - t)*1000:.0f} ms, score {(done - loaded)*1000:.0f} ms")